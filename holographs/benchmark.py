@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+import numpy as np
+import PySide6
+from PySide6.QtGui import QGuiApplication
+
+from timeseries import TimeSeriesGraph
+from ranking import rankNodes
+from render import GraphRenderer, HIGHLIGHT_COLORS, getNodeColors, encodeImage
+
+
+def generateSeries(out, nodes = 1000, density = 2.0, slices = 10, churn = 0.1, seed = 0):
+    # slices in the schema of the exported data: nodes with id/name/centrality
+    # and a layout position, edges with copies of their end nodes and a weight.
+    # Positions drift between slices and a churn fraction of the nodes is
+    # replaced by new ones every slice
+    rng = np.random.default_rng(seed)
+    os.makedirs(out, exist_ok=True)
+    ids = np.arange(nodes)
+    next_id = nodes
+    x = rng.uniform(-200, 200, nodes)
+    y = rng.uniform(-200, 200, nodes)
+    centrality = rng.integers(1, 100, nodes)
+    edge_count = int(round(density * nodes))
+    files = []
+    for year in range(slices):
+        if year > 0:
+            leaving = np.flatnonzero(rng.random(nodes) < churn)
+            ids[leaving] = np.arange(next_id, next_id + len(leaving))
+            next_id += len(leaving)
+            x[leaving] = rng.uniform(-200, 200, len(leaving))
+            y[leaving] = rng.uniform(-200, 200, len(leaving))
+            x += rng.normal(0, 5, nodes)
+            y += rng.normal(0, 5, nodes)
+            centrality = np.clip(centrality + rng.integers(-5, 6, nodes), 1, None)
+
+        node_list = []
+        for i, node_id in enumerate(ids.tolist()):
+            node_list.append({'id': node_id, 'name': 'node ' + str(node_id), 'centrality': int(centrality[i]), 'index': i, 'x': float(x[i]), 'y': float(y[i]), 'vy': 0.0, 'vx': 0.0})
+        source = rng.integers(0, nodes, edge_count)
+        target = rng.integers(0, nodes, edge_count)
+        loops = source == target
+        target[loops] = (target[loops] + 1) % nodes
+        weight = rng.integers(1, 1000, edge_count)
+        edge_list = []
+        for e, (s, t, w) in enumerate(zip(source.tolist(), target.tolist(), weight.tolist())):
+            edge_list.append({'source': node_list[s], 'target': node_list[t], 'weight': w, 'year': year, 'id': str(node_list[s]['id']) + '-' + str(node_list[t]['id']), 'index': e})
+
+        filename = os.path.join(out, 'synthetic_year' + str(year + 1) + '.json')
+        with open(filename, 'w') as slice_file:
+            json.dump({'year': year, 'nodes': node_list, 'edges': edge_list}, slice_file)
+        files.append(filename)
+    return files
+
+
+def timed(stages, name, function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    stage = stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+    stage['seconds'] += time.perf_counter() - start
+    stage['calls'] += 1
+    return result
+
+
+def runBenchmark(path, ppmm = 10, top_k = 10, rank_by = 'median', stream = False, base_mode = 'lines'):
+    # the stages of GraphRenderer.drawStuff one by one, serial and uncached
+    renderer = GraphRenderer(base_mode=base_mode)
+    stages = {}
+    graph = timed(stages, 'load', TimeSeriesGraph, path, stream)
+    [renderer.graph_x_min, renderer.graph_x_max, renderer.graph_y_min, renderer.graph_y_max, renderer.centrality_min, renderer.centrality_max, renderer.edge_weight_min, renderer.edge_weight_max] = timed(stages, 'bounds', graph.bounds)
+    ranks = timed(stages, 'ranking', rankNodes, graph, top_k, rank_by)
+    highlight = [x[0] for x in ranks]
+    node_colors = timed(stages, 'colors', getNodeColors, graph, HIGHLIGHT_COLORS, highlight)
+
+    geometry = (210 * ppmm, 148 * ppmm, 20 * ppmm, 10 * ppmm)
+    for pg in range(1, len(graph.slices) + 2):
+        img_key, ol_key, draw_img, draw_ol = renderer.pageLayers(graph, pg, *geometry, node_colors, highlight)
+        if pg <= len(graph.slices):
+            img = timed(stages, 'getImg', draw_img)
+            ol = timed(stages, 'getTimesliceOverlay', draw_ol)
+        else:
+            img = timed(stages, 'getLineOverlay', draw_img)
+            ol = timed(stages, 'getLableOverlay', draw_ol)
+        page = timed(stages, 'compose', renderer.composePage, img, ol, pg, *geometry)
+        timed(stages, 'encode', encodeImage, page)
+
+    return {
+        'input': path,
+        'slices': len(graph.slices),
+        'nodes': graph.nodeCount(),
+        'edges': sum(ts.edgeCount() for ts in graph.slices),
+        'ppmm': ppmm,
+        'top_k': top_k,
+        'base_mode': base_mode,
+        'stages': stages,
+        'total_seconds': sum(stage['seconds'] for stage in stages.values()),
+        'versions': {'python': platform.python_version(), 'numpy': np.__version__, 'pyside6': PySide6.__version__},
+    }
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Time every stage of the page rendering on generated or existing slices and report JSON.")
+    parser.add_argument("--input", default=None, help="directory of slices to render; a synthetic series is generated when omitted")
+    parser.add_argument("--nodes", type=int, default=1000, help="nodes per generated slice")
+    parser.add_argument("--density", type=float, default=2.0, help="edges per node in a generated slice")
+    parser.add_argument("--slices", type=int, default=10, help="number of generated slices")
+    parser.add_argument("--churn", type=float, default=0.1, help="fraction of nodes replaced between generated slices")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the generator")
+    parser.add_argument("--keep", default=None, help="write the generated slices to this directory instead of a temporary one")
+    parser.add_argument("--ppmm", type=int, default=10, help="pixels per millimetre of the A5 page")
+    parser.add_argument("--top-k", type=int, default=10, help="number of highest ranked nodes to highlight")
+    parser.add_argument("--base", default="lines", choices=["lines", "density"], help="base layer mode to time")
+    parser.add_argument("--stream", action="store_true", help="parse slices incrementally")
+    parser.add_argument("--output", default=None, help="file for the JSON report, standard output when omitted")
+    args = parser.parse_args(argv)
+
+    app = QGuiApplication.instance()
+    if app is None:
+        app = QGuiApplication(["holographs", "-platform", "offscreen"])
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = args.input
+        generator = None
+        if path is None:
+            path = args.keep or scratch
+            generator = dict(nodes=args.nodes, density=args.density, slices=args.slices, churn=args.churn, seed=args.seed)
+            generateSeries(path, **generator)
+        report = runBenchmark(path, args.ppmm, args.top_k, stream=args.stream, base_mode=args.base)
+    report['generator'] = generator
+
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w') as report_file:
+            report_file.write(text + '\n')
+
+if __name__ == "__main__":
+    main()
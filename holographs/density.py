@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def edgeDensity(x1, y1, x2, y2, weight, width, height, top = 0, chunk_samples = 1 << 22):
+    # sum of edge weights over the pixels each edge passes through, for the
+    # rows top..top+height of the image. Edges are sampled once per pixel along
+    # their major axis (a DDA line), a chunk of edges at a time so the sample
+    # arrays stay bounded however many edges there are
+    grid = np.zeros(width * height)
+    dx = x2 - x1
+    dy = y2 - y1
+    steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64)
+    # edges entirely above or below the rows asked for add nothing
+    edges = np.flatnonzero((np.maximum(y1, y2) >= top - 1) & (np.minimum(y1, y2) < top + height + 1))
+    samples = np.cumsum(steps[edges] + 1)
+
+    begin = 0
+    while begin < len(edges):
+        base = samples[begin - 1] if begin > 0 else 0
+        end = max(int(np.searchsorted(samples, base + chunk_samples, side='right')), begin + 1)
+        chunk = edges[begin:end]
+        count = steps[chunk] + 1
+        span = np.maximum(steps[chunk], 1)
+        # position along the edge of every sample, then start + k * step;
+        # float32 is exact enough for pixel positions and halves the traffic
+        k = np.arange(int(count.sum()), dtype=np.float32)
+        k -= np.repeat((np.cumsum(count) - count).astype(np.float32), count)
+        sx = np.repeat((dx[chunk] / span).astype(np.float32), count)
+        sx *= k
+        sx += np.repeat(x1[chunk].astype(np.float32), count)
+        sy = np.repeat((dy[chunk] / span).astype(np.float32), count)
+        sy *= k
+        sy += np.repeat(y1[chunk].astype(np.float32), count)
+        ix = np.rint(sx, out=sx).astype(np.int64)
+        iy = np.rint(sy, out=sy).astype(np.int64)
+        iy -= top
+        w = np.repeat(weight[chunk], count)
+        keep = (ix >= 0) & (ix < width) & (iy >= 0) & (iy < height)
+        if not keep.all():
+            ix = ix[keep]
+            iy = iy[keep]
+            w = w[keep]
+        iy *= width
+        iy += ix
+        grid += np.bincount(iy, weights=w, minlength=width * height)
+        begin = end
+    return grid.reshape(height, width)
+
+
+def toneMap(grid, scale, top, color):
+    # RGBA pixels on a log scale from white, through color where one edge of
+    # weight scale passed, to black at a density of top. Both are global, so
+    # the shade does not depend on the rest of the slice and tiles match
+    top = max(top, 2 * scale)
+    ink = np.log1p(grid / scale) / np.log1p(top / scale)
+    light = np.log(2) / np.log1p(top / scale)
+    rgba = np.empty(grid.shape + (4,), dtype=np.uint8)
+    for channel, value in enumerate(color):
+        rgba[:, :, channel] = np.rint(np.interp(ink, [0, light, 1], [255, value, 0]))
+    rgba[:, :, 3] = 255
+    return rgba
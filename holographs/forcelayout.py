@@ -0,0 +1,217 @@
+import hashlib
+import argparse
+
+import numpy as np
+
+from timeseries import TimeSeriesGraph
+
+# the forces of the d3 simulation the slices were laid out with, see
+# layout() in src/components/graph/graph.component.ts
+FORCES = dict(charge = -900, link_distance = 250, link_strength = 0.25, gravity = 0.15)
+
+
+def repulsion(x, y, rows, distance_min = 1, chunk = 1024):
+    # sum over all other nodes of (other - node) / distance^2 for the nodes
+    # rows, like d3's many-body force before its strength is applied. Nodes
+    # are binned into a grid of about 3 sqrt(n) cells: the ones in the 3x3
+    # cells around a node count exactly, every other cell through its centre
+    # of mass, so a node costs O(sqrt(n)) instead of O(n)
+    n = len(x)
+    fx = np.zeros(len(rows))
+    fy = np.zeros(len(rows))
+    if n < 2 or len(rows) == 0:
+        return fx, fy
+    grid = max(int(round(np.sqrt(3) * n ** 0.25)), 1)
+    x0 = x.min()
+    y0 = y.min()
+    size = max(x.max() - x0, y.max() - y0) / grid
+    if size <= 0:
+        size = 1
+    cx = np.minimum(((x - x0) / size).astype(np.intp), grid - 1)
+    cy = np.minimum(((y - y0) / size).astype(np.intp), grid - 1)
+    cell = cy * grid + cx
+    count = np.bincount(cell, minlength=grid * grid)
+    occupied = np.flatnonzero(count)
+    mass = count[occupied]
+    mx = np.bincount(cell, x, grid * grid)[occupied] / mass
+    my = np.bincount(cell, y, grid * grid)[occupied] / mass
+    ox = occupied % grid
+    oy = occupied // grid
+    order = np.argsort(cell, kind='stable')
+    start = np.r_[0, np.cumsum(count)]
+    min2 = distance_min * distance_min
+
+    for begin in range(0, len(rows), chunk):
+        r = rows[begin:begin + chunk]
+        # far cells through their centre of mass
+        dx = mx[None, :] - x[r, None]
+        dy = my[None, :] - y[r, None]
+        w = mass / np.maximum(dx * dx + dy * dy, min2)
+        w[(np.abs(ox[None, :] - cx[r, None]) <= 1) & (np.abs(oy[None, :] - cy[r, None]) <= 1)] = 0
+        fx[begin:begin + len(r)] = (dx * w).sum(axis=1)
+        fy[begin:begin + len(r)] = (dy * w).sum(axis=1)
+
+        # the nodes of the neighbouring cells one by one
+        for ddy in (-1, 0, 1):
+            for ddx in (-1, 0, 1):
+                ncx = cx[r] + ddx
+                ncy = cy[r] + ddy
+                valid = (ncx >= 0) & (ncx < grid) & (ncy >= 0) & (ncy < grid)
+                ncell = np.where(valid, ncy * grid + ncx, 0)
+                first = start[ncell]
+                counts = np.where(valid, start[ncell + 1] - first, 0)
+                total = int(counts.sum())
+                if total == 0:
+                    continue
+                source = np.repeat(np.arange(len(r)), counts)
+                other = order[np.repeat(first - (np.cumsum(counts) - counts), counts) + np.arange(total)]
+                node = r[source]
+                dx = x[other] - x[node]
+                dy = y[other] - y[node]
+                w = 1 / np.maximum(dx * dx + dy * dy, min2)
+                w[other == node] = 0
+                fx[begin:begin + len(r)] += np.bincount(source, dx * w, len(r))
+                fy[begin:begin + len(r)] += np.bincount(source, dy * w, len(r))
+    return fx, fy
+
+
+def relax(x, y, source, target, movable, iterations = 100, alpha = 0.3, alpha_min = 0.001, velocity_decay = 0.4, charge = -900, link_distance = 250, link_strength = 0.25, gravity = 0.15):
+    # d3 force simulation ticks that only move the movable nodes; the others
+    # stay where they are and still push and pull on them. Alpha cools from
+    # alpha to alpha_min over the iterations
+    x = np.array(x, dtype=np.float64)
+    y = np.array(y, dtype=np.float64)
+    rows = np.flatnonzero(movable)
+    if len(rows) == 0:
+        return x, y
+    n = len(x)
+    vx = np.zeros(n)
+    vy = np.zeros(n)
+    # only links touching a movable node matter
+    links = np.flatnonzero(movable[source] | movable[target])
+    source = source[links]
+    target = target[links]
+    degree = np.bincount(source, minlength=n) + np.bincount(target, minlength=n)
+    bias = degree[source] / np.maximum(degree[source] + degree[target], 1)
+    decay = 1 - (alpha_min / alpha) ** (1 / max(iterations, 1))
+
+    for i in range(iterations):
+        # link springs towards link_distance, the lighter end moves more
+        dx = x[target] + vx[target] - x[source] - vx[source]
+        dy = y[target] + vy[target] - y[source] - vy[source]
+        length = np.maximum(np.hypot(dx, dy), 1e-9)
+        pull = (length - link_distance) / length * alpha * link_strength
+        dx *= pull
+        dy *= pull
+        ax = np.bincount(source, dx * (1 - bias), n) - np.bincount(target, dx * bias, n)
+        ay = np.bincount(source, dy * (1 - bias), n) - np.bincount(target, dy * bias, n)
+
+        fx, fy = repulsion(x, y, rows)
+        ax[rows] += fx * charge * alpha - x[rows] * gravity * alpha
+        ay[rows] += fy * charge * alpha - y[rows] * gravity * alpha
+
+        vx[rows] = (vx[rows] + ax[rows]) * (1 - velocity_decay)
+        vy[rows] = (vy[rows] + ay[rows]) * (1 - velocity_decay)
+        x[rows] += vx[rows]
+        y[rows] += vy[rows]
+        alpha -= alpha * decay
+    return x, y
+
+
+def changedNodes(ts, previous_edges, placed, hops = 1):
+    # slice nodes without a position in the previous slice or whose links
+    # changed since, and the nodes within hops links of them
+    rows = ts.node_rows
+    a = np.minimum(rows[ts.edge_source], rows[ts.edge_target])
+    b = np.maximum(rows[ts.edge_source], rows[ts.edge_target])
+    edges = np.unique(a.astype(np.int64) << 32 | b)
+    changed = np.setxor1d(edges, previous_edges, assume_unique=True)
+    moved = np.zeros(len(rows), dtype=bool)
+    moved[~placed] = True
+    touched = np.union1d(changed >> 32, changed & 0xffffffff)
+    moved |= np.isin(rows, touched)
+    for i in range(hops):
+        near = moved[ts.edge_source] | moved[ts.edge_target]
+        moved[ts.edge_source[near]] = True
+        moved[ts.edge_target[near]] = True
+    return moved, edges
+
+
+def stabilizeLayout(graph, iterations = 100, hops = 1, alpha = 0.3, seed = 0, **forces):
+    # lays every slice after the first out again, starting from where its
+    # nodes were in the slice before and relaxing only the nodes whose links
+    # changed, so trajectories follow changes in the graph rather than the
+    # independent runs of the original layout. Nodes seen before but not in
+    # the previous slice start at their last position, new nodes at the
+    # centre of their placed neighbours or else their own file position.
+    # Returns the name, relaxed and total node count of every slice
+    forces = dict(FORCES, **forces)
+    rng = np.random.default_rng(seed)
+    last_x = np.zeros(graph.nodeCount())
+    last_y = np.zeros(graph.nodeCount())
+    seen = np.zeros(graph.nodeCount(), dtype=bool)
+    present = np.zeros(graph.nodeCount(), dtype=bool)
+    previous_edges = np.zeros(0, dtype=np.int64)
+    previous_digest = ''
+    report = []
+    for k, ts in enumerate(graph.slices):
+        rows = ts.node_rows
+        placed = present[rows]
+        if k == 0:
+            # the first slice keeps its layout
+            x = np.array(ts.x, dtype=np.float64)
+            y = np.array(ts.y, dtype=np.float64)
+            moved, previous_edges = changedNodes(ts, previous_edges, placed, 0)
+        else:
+            moved, previous_edges = changedNodes(ts, previous_edges, placed, hops)
+            x = np.where(seen[rows], last_x[rows], ts.x)
+            y = np.where(seen[rows], last_y[rows], ts.y)
+            new = np.flatnonzero(~seen[rows])
+            if len(new) > 0:
+                anchored = seen[rows]
+                sx = np.bincount(ts.edge_source, anchored[ts.edge_target] * x[ts.edge_target], len(rows)) + np.bincount(ts.edge_target, anchored[ts.edge_source] * x[ts.edge_source], len(rows))
+                sy = np.bincount(ts.edge_source, anchored[ts.edge_target] * y[ts.edge_target], len(rows)) + np.bincount(ts.edge_target, anchored[ts.edge_source] * y[ts.edge_source], len(rows))
+                n = np.bincount(ts.edge_source, anchored[ts.edge_target], len(rows)) + np.bincount(ts.edge_target, anchored[ts.edge_source], len(rows))
+                new = new[n[new] > 0]
+                # a little jitter keeps nodes with the same neighbours apart
+                x[new] = sx[new] / n[new] + rng.uniform(-1, 1, len(new))
+                y[new] = sy[new] / n[new] + rng.uniform(-1, 1, len(new))
+            x, y = relax(x, y, ts.edge_source, ts.edge_target, moved, iterations, alpha, **forces)
+
+        ts.x = x
+        ts.y = y
+        ts.coords = None
+        # the positions now depend on every slice before, and so do the
+        # cached layers drawn from them
+        key = hashlib.sha256((previous_digest + str(ts.digest) + repr((iterations, hops, alpha, seed, sorted(forces.items())))).encode('utf-8'))
+        ts.digest = previous_digest = key.hexdigest()
+        last_x[rows] = x
+        last_y[rows] = y
+        seen[rows] = True
+        present[:] = False
+        present[rows] = True
+        report.append((ts.name, int(moved.sum()) if k > 0 else 0, len(rows)))
+
+    # the positions are no longer those in a mapped file, worker processes
+    # need the arrays themselves
+    graph.mapped = None
+    return report
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Lay the slices of a series out again, each one warm started from the slice before, and write them as a binary file for the renderer.")
+    parser.add_argument("input", help="directory with one JSON file per timeslice, or a binary file written by timeseries.py")
+    parser.add_argument("output", help="binary file to write, pass it as --input to the renderer")
+    parser.add_argument("--stream", action="store_true", help="parse slices incrementally instead of loading each JSON document whole")
+    parser.add_argument("--iterations", type=int, default=100, help="simulation ticks per slice")
+    parser.add_argument("--hops", type=int, default=1, help="also relax the nodes this many links away from a changed one")
+    args = parser.parse_args(argv)
+
+    graph = TimeSeriesGraph(args.input, args.stream)
+    for name, moved, nodes in stabilizeLayout(graph, args.iterations, args.hops):
+        print(name, moved, "of", nodes, "nodes relaxed")
+    graph.writeBinary(args.output)
+    print(len(graph.slices), "slices,", graph.nodeCount(), "nodes written to", args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import cProfile
+import tracemalloc
+import contextlib
+
+try:
+    import resource
+except ImportError:
+    # not on Windows; peak RSS is reported as 0 there
+    resource = None
+
+
+def peakRss():
+    # bytes; ru_maxrss is in kilobytes on Linux and bytes on macOS
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+class Instrument:
+    # wall time, CPU time, peak RSS and counts of drawn items per pipeline
+    # stage; stages nest, items are counted on the innermost open one
+    def __init__(self, profile = False, trace_memory = False):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profiler = None
+        self.events = []
+        self.stack = []
+
+    def __getstate__(self):
+        # worker processes get a copy without the recorded events or the
+        # profiler, their own events are sent back with drain()
+        state = dict(self.__dict__)
+        state['profiler'] = None
+        state['events'] = []
+        state['stack'] = []
+        return state
+
+    def start(self):
+        if self.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    @contextlib.contextmanager
+    def stage(self, name, **args):
+        record = {'name': name, 'args': args, 'items': {}, 'pid': os.getpid()}
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # the peak is reset for every stage, the enclosing one keeps what
+            # it reached so far
+            if self.stack:
+                outer = self.stack[-1]
+                outer['peak_python'] = max(outer.get('peak_python', 0), tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.stack.append(record)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+            record['start'] = wall
+            record['peak_rss'] = peakRss()
+            if self.trace_memory:
+                record['peak_python'] = max(record.get('peak_python', 0), tracemalloc.get_traced_memory()[1])
+            self.stack.pop()
+            self.events.append(record)
+
+    def count(self, kind, items):
+        if self.stack:
+            counts = self.stack[-1]['items']
+            counts[kind] = counts.get(kind, 0) + int(items)
+
+    def drain(self):
+        events = self.events
+        self.events = []
+        return events
+
+    def merge(self, events):
+        self.events.extend(events)
+
+    def summary(self):
+        stages = {}
+        for event in self.events:
+            stage = stages.setdefault(event['name'], {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak_rss': 0, 'peak_python': 0, 'items': {}})
+            stage['calls'] += 1
+            stage['wall'] += event['wall']
+            stage['cpu'] += event['cpu']
+            stage['peak_rss'] = max(stage['peak_rss'], event['peak_rss'])
+            stage['peak_python'] = max(stage['peak_python'], event.get('peak_python', 0))
+            for kind, items in event['items'].items():
+                stage['items'][kind] = stage['items'].get(kind, 0) + items
+
+        lines = ['%-22s %6s %10s %10s %10s %10s  %s' % ('stage', 'calls', 'wall s', 'cpu s', 'rss MB', 'py MB', 'items')]
+        for name, stage in sorted(stages.items(), key=lambda item: -item[1]['wall']):
+            items = ', '.join(kind + ' ' + str(count) for kind, count in sorted(stage['items'].items()))
+            lines.append('%-22s %6d %10.3f %10.3f %10.1f %10.1f  %s' % (name, stage['calls'], stage['wall'], stage['cpu'], stage['peak_rss'] / 2**20, stage['peak_python'] / 2**20, items))
+        return '\n'.join(lines)
+
+    def writeTrace(self, filename):
+        # Chrome trace event format, open in chrome://tracing or Perfetto;
+        # every process gets its own track
+        events = []
+        for event in self.events:
+            args = {str(key): str(value) for key, value in event['args'].items()}
+            args.update(event['items'])
+            args['cpu_ms'] = round(event['cpu'] * 1e3, 3)
+            args['peak_rss_mb'] = round(event['peak_rss'] / 2**20, 1)
+            if 'peak_python' in event:
+                args['peak_python_mb'] = round(event['peak_python'] / 2**20, 1)
+            events.append({'name': event['name'], 'ph': 'X', 'ts': event['start'] * 1e6, 'dur': event['wall'] * 1e6, 'pid': event['pid'], 'tid': event['pid'], 'args': args})
+        with open(filename, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+
+    def writeProfile(self, filename):
+        if self.profiler is not None:
+            self.profiler.dump_stats(filename)
@@ -0,0 +1,98 @@
+import numpy as np
+
+
+class LabelGrid:
+    # uniform grid over the boxes of placed labels; placed labels never
+    # overlap, so a cell only ever holds a handful of them and a lookup costs
+    # the same however many labels there are
+    def __init__(self, cell_width, cell_height):
+        self.cell_width = max(cell_width, 1)
+        self.cell_height = max(cell_height, 1)
+        self.cells = {}
+        self.boxes = []
+
+    def cellsOf(self, box):
+        x0, y0, x1, y1 = box
+        return [(cx, cy) for cx in range(int(x0 // self.cell_width), int(x1 // self.cell_width) + 1) for cy in range(int(y0 // self.cell_height), int(y1 // self.cell_height) + 1)]
+
+    def collides(self, box):
+        x0, y0, x1, y1 = box
+        cells = self.cells
+        boxes = self.boxes
+        for cell in self.cellsOf(box):
+            if cell in cells:
+                for other in cells[cell]:
+                    ox0, oy0, ox1, oy1 = boxes[other]
+                    if x0 < ox1 and ox0 < x1 and y0 < oy1 and oy0 < y1:
+                        return True
+        return False
+
+    def insert(self, box):
+        index = len(self.boxes)
+        self.boxes.append(box)
+        for cell in self.cellsOf(box):
+            self.cells.setdefault(cell, []).append(index)
+
+
+def coveredCells(covered):
+    # summed area table of the covered cells, padded with a zero row and column
+    table = np.zeros((covered.shape[0] + 1, covered.shape[1] + 1), dtype=np.int32)
+    np.cumsum(np.cumsum(covered, axis=0, dtype=np.int32), axis=1, out=table[1:, 1:])
+    return table
+
+
+def placeLabels(x, y, widths, ascent, descent, priority, shadow = 1, chunk = 4096):
+    # greedy placement, highest priority first: a label is tried right of its
+    # anchor on the baseline, then below it, then left of the anchor above and
+    # below; it is dropped when all four overlap a label placed before it.
+    # Returns the placed labels' indices in priority order and their anchors
+    placed = []
+    px = []
+    py = []
+    if len(x) == 0:
+        return placed, px, py
+
+    order = np.argsort(-np.asarray(priority, dtype=np.float64), kind="stable")
+    x = np.asarray(x, dtype=np.float64)[order]
+    y = np.asarray(y, dtype=np.float64)[order]
+    widths = np.asarray(widths, dtype=np.float64)[order]
+    height = ascent + descent
+    # candidate boxes, label x candidate
+    lx = np.stack([x, x, x - widths, x - widths], axis=1)
+    ly = np.stack([y, y + height, y, y + height], axis=1)
+    x0 = lx
+    y0 = ly - ascent
+    x1 = lx + widths[:, None] + shadow
+    y1 = ly + descent + shadow
+
+    grid = LabelGrid(float(np.median(widths)) + shadow, height + shadow)
+
+    # most labels of a crowded graph have no room left at all; a coarse grid
+    # marks the cells placed labels cover completely so those are rejected a
+    # chunk at a time, only the rest go through the exact test of the grid
+    size = max(height / 4, 1)
+    left = x0.min()
+    top = y0.min()
+    c0 = np.floor((x0 - left) / size).astype(np.int64)
+    r0 = np.floor((y0 - top) / size).astype(np.int64)
+    c1 = np.ceil((x1 - left) / size).astype(np.int64)
+    r1 = np.ceil((y1 - top) / size).astype(np.int64)
+    covered = np.zeros((int(r1.max()) + 1, int(c1.max()) + 1), dtype=bool)
+
+    for begin in range(0, len(order), chunk):
+        end = begin + chunk
+        table = coveredCells(covered)
+        cr0, cr1, cc0, cc1 = r0[begin:end], r1[begin:end], c0[begin:end], c1[begin:end]
+        blocked = (table[cr1, cc1] - table[cr0, cc1] - table[cr1, cc0] + table[cr0, cc0]) > 0
+        for k in np.flatnonzero(~blocked.all(axis=1)).tolist():
+            i = begin + k
+            for c in np.flatnonzero(~blocked[k]).tolist():
+                box = (x0[i, c], y0[i, c], x1[i, c], y1[i, c])
+                if not grid.collides(box):
+                    grid.insert(box)
+                    placed.append(int(order[i]))
+                    px.append(float(lx[i, c]))
+                    py.append(float(ly[i, c]))
+                    covered[int(np.ceil((box[1] - top) / size)):int(np.floor((box[3] - top) / size)), int(np.ceil((box[0] - left) / size)):int(np.floor((box[2] - left) / size))] = True
+                    break
+    return placed, px, py
@@ -0,0 +1,86 @@
+import os
+import json
+
+from PySide6.QtGui import QTransform
+
+# the two layers of every page: the base layer above the overlay
+LAYERS = ('base', 'overlay')
+ROTATIONS = (0, 90, 180, 270)
+
+
+class PageLayout:
+    # where the layers of every page go on the output sheets. A layer is
+    # width x height millimetres with the page number at the margin, a cell
+    # stacks the layers listed top to bottom, and a sheet holds columns x rows
+    # cells filled row by row (n-up), each rotated by rotation degrees and
+    # drawn at scale. The default is one page per sheet, base above overlay
+    def __init__(self, width = 210, height = 148, margin_x = 20, margin_y = 10, layers = LAYERS, columns = 1, rows = 1, rotation = 0, scale = 1):
+        layers = tuple(layers)
+        if len(layers) == 0 or any(layer not in LAYERS for layer in layers):
+            raise ValueError('layers must be a list of ' + ', '.join(LAYERS))
+        if rotation not in ROTATIONS:
+            raise ValueError('rotation must be one of ' + ', '.join(map(str, ROTATIONS)))
+        if columns < 1 or rows < 1 or scale <= 0:
+            raise ValueError('columns and rows must be at least 1 and scale positive')
+        self.width = width
+        self.height = height
+        self.margin_x = margin_x
+        self.margin_y = margin_y
+        self.layers = layers
+        self.columns = columns
+        self.rows = rows
+        self.rotation = rotation
+        self.scale = scale
+
+    def spec(self):
+        spec = dict(self.__dict__)
+        spec['layers'] = list(self.layers)
+        return spec
+
+    def geometry(self, ppmm):
+        # layer width, height and margins in pixels
+        return tuple(int(round(mm * ppmm)) for mm in (self.width, self.height, self.margin_x, self.margin_y))
+
+    def cellSize(self, width, height):
+        stack = height * len(self.layers)
+        if self.rotation in (90, 270):
+            return stack * self.scale, width * self.scale
+        return width * self.scale, stack * self.scale
+
+    def sheetSize(self, width, height):
+        cell_width, cell_height = self.cellSize(width, height)
+        return int(round(self.columns * cell_width)), int(round(self.rows * cell_height))
+
+    def sheetCount(self, page_count):
+        per_sheet = self.columns * self.rows
+        return (page_count + per_sheet - 1) // per_sheet
+
+    def sheetPages(self, sheet, page_count):
+        per_sheet = self.columns * self.rows
+        return range((sheet - 1) * per_sheet + 1, min(sheet * per_sheet, page_count) + 1)
+
+    def cellTransform(self, index, width, height):
+        # maps the layer stack of the index-th cell, layer j at
+        # (0, j * height), to sheet pixels
+        cell_width, cell_height = self.cellSize(width, height)
+        stack = height * len(self.layers)
+        transform = QTransform()
+        transform.translate(index % self.columns * cell_width, index // self.columns * cell_height)
+        transform.scale(self.scale, self.scale)
+        if self.rotation == 90:
+            transform.translate(stack, 0)
+        elif self.rotation == 180:
+            transform.translate(width, stack)
+        elif self.rotation == 270:
+            transform.translate(0, width)
+        transform.rotate(self.rotation)
+        return transform
+
+
+def loadLayout(spec):
+    # a layout from a JSON object with the arguments of PageLayout, given
+    # inline or as the name of a file holding it
+    if os.path.isfile(spec):
+        with open(spec) as layout_file:
+            spec = layout_file.read()
+    return PageLayout(**json.loads(spec))
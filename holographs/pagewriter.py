@@ -0,0 +1,189 @@
+import os
+import queue
+import struct
+import threading
+import zlib
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class PngStreamWriter:
+    # writes an RGBA PNG a band of rows at a time, so a page never has to
+    # exist as one image in memory
+    def __init__(self, filename, width, height, level = 6):
+        self.file = open(filename, "wb")
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.compressor = zlib.compressobj(level)
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        # 8 bit RGBA, deflate, adaptive filtering, no interlace
+        self.chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+
+    def chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    def writeRows(self, rgba, count):
+        pixels = np.frombuffer(rgba, dtype=np.uint8, count=count * self.width * 4).reshape(count, self.width * 4)
+        # filter type 1 (sub): each byte minus the same channel of the pixel to its left
+        filtered = np.empty((count, self.width * 4 + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:5] = pixels[:, 0:4]
+        np.subtract(pixels[:, 4:], pixels[:, :-4], out=filtered[:, 5:])
+        data = self.compressor.compress(filtered.tobytes())
+        if data:
+            self.chunk(b'IDAT', data)
+        self.rows += count
+
+    def close(self):
+        self.chunk(b'IDAT', self.compressor.flush())
+        self.chunk(b'IEND', b'')
+        self.file.close()
+
+
+class TiffStreamWriter:
+    # uncompressed RGBA baseline TIFF, one strip per band; the directory
+    # goes after the pixel data once all strip offsets are known
+    def __init__(self, filename, width, height):
+        self.file = open(filename, "wb")
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.rows_per_strip = None
+        self.strip_offsets = []
+        self.strip_sizes = []
+        # little endian header, the directory offset is patched in close()
+        self.file.write(b'II*\x00\x00\x00\x00\x00')
+
+    def writeRows(self, rgba, count):
+        if self.rows_per_strip is None:
+            self.rows_per_strip = count
+        size = count * self.width * 4
+        self.strip_offsets.append(self.file.tell())
+        self.strip_sizes.append(size)
+        self.file.write(memoryview(rgba)[0:size])
+        self.rows += count
+
+    def close(self):
+        def array(values):
+            offset = self.file.tell()
+            self.file.write(struct.pack('<%dI' % len(values), *values))
+            return offset
+
+        strips = len(self.strip_offsets)
+        bits_offset = self.file.tell()
+        self.file.write(struct.pack('<4H', 8, 8, 8, 8))
+        offsets_at = array(self.strip_offsets) if strips > 1 else None
+        sizes_at = array(self.strip_sizes) if strips > 1 else None
+        if self.file.tell() % 2:
+            self.file.write(b'\x00')
+
+        # (tag, type, count, value); type 3 is SHORT, 4 is LONG
+        entries = [
+            (256, 4, 1, self.width),
+            (257, 4, 1, self.height),
+            (258, 3, 4, bits_offset),
+            (259, 3, 1, 1),
+            (262, 3, 1, 2),
+            (273, 4, strips, offsets_at if strips > 1 else self.strip_offsets[0]),
+            (277, 3, 1, 4),
+            (278, 4, 1, self.rows_per_strip or self.height),
+            (279, 4, strips, sizes_at if strips > 1 else self.strip_sizes[0]),
+            (284, 3, 1, 1),
+            (338, 3, 1, 2),
+        ]
+        directory = self.file.tell()
+        self.file.write(struct.pack('<H', len(entries)))
+        for tag, kind, count, value in entries:
+            if kind == 3 and count == 1:
+                self.file.write(struct.pack('<HHIHH', tag, kind, count, value, 0))
+            else:
+                self.file.write(struct.pack('<HHII', tag, kind, count, value))
+        self.file.write(struct.pack('<I', 0))
+        self.file.seek(4)
+        self.file.write(struct.pack('<I', directory))
+        self.file.close()
+
+
+class RawStreamWriter:
+    # bare 8 bit RGBA rows, top to bottom, for tools that take the size
+    # separately (e.g. convert -size WxH -depth 8 rgba:page_1.rgba page_1.png)
+    def __init__(self, filename, width, height):
+        self.file = open(filename, "wb")
+        self.width = width
+        self.height = height
+        self.rows = 0
+
+    def writeRows(self, rgba, count):
+        self.file.write(memoryview(rgba)[0:count * self.width * 4])
+        self.rows += count
+
+    def close(self):
+        self.file.close()
+
+
+# (name for QImage.save, file extension, band writer)
+PAGE_FORMATS = {
+    'png': ('PNG', '.png', PngStreamWriter),
+    'tiff': ('TIFF', '.tif', TiffStreamWriter),
+    'raw': ('RGBA', '.rgba', RawStreamWriter),
+}
+
+
+def pageFilename(out, pg, fmt):
+    return os.path.join(out, "page_" + str(pg) + PAGE_FORMATS[fmt][1])
+
+
+def openPageWriter(filename, fmt, width, height, level = 6):
+    if fmt == 'png':
+        return PngStreamWriter(filename, width, height, level)
+    return PAGE_FORMATS[fmt][2](filename, width, height)
+
+
+class PageWriterQueue:
+    # runs page encoding and writing on background threads while the next
+    # page renders; QImage.save and zlib release the GIL. At most max_pending
+    # pages or bands wait, submit blocks beyond that so memory stays bounded
+    def __init__(self, threads = 2, max_pending = None):
+        self.queue = queue.Queue(max_pending or 2 * threads)
+        self.errors = []
+        self.threads = [threading.Thread(target=self.run, daemon=True) for i in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, function, *args, after = None):
+        # returns a future of the job. One given as after has to finish first
+        # and the job is dropped if it failed, for work that goes in order
+        # like the bands of one file. Jobs are taken in the order submitted,
+        # so the one waited for is always running already
+        future = Future()
+        self.queue.put((function, args, after, future))
+        return future
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            function, args, after, future = job
+            try:
+                if after is not None and after.exception() is not None:
+                    future.set_exception(after.exception())
+                    continue
+                future.set_result(function(*args))
+            except Exception as error:
+                self.errors.append(error)
+                future.set_exception(error)
+
+    def close(self):
+        # waits for every submitted page, then re-raises the first failure
+        for thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+def simplifyPath(x, y, tolerance):
+    # Douglas-Peucker: indices of the vertices that keep the polyline within
+    # tolerance (image pixels) of the original. Every split keeps one vertex,
+    # so the work follows the detail that is left rather than the point count
+    n = len(x)
+    if n <= 2 or tolerance <= 0:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[n - 1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        length = np.hypot(dx, dy)
+        ix = x[first + 1:last] - x[first]
+        iy = y[first + 1:last] - y[first]
+        if length > 0:
+            dist = np.abs(ix * dy - iy * dx) / length
+        else:
+            # closed loop, measure from the shared end point
+            dist = np.hypot(ix, iy)
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            split = first + 1 + k
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+
+def spacedPoints(x, y, spacing):
+    # indices of the points at least spacing apart along the path, keeping
+    # both ends; one lookup per point kept
+    n = len(x)
+    if n <= 1 or spacing <= 0:
+        return np.arange(n)
+    travelled = np.r_[0, np.cumsum(np.hypot(np.diff(x), np.diff(y)))]
+    kept = [0]
+    while True:
+        i = int(np.searchsorted(travelled, travelled[kept[-1]] + spacing))
+        if i >= n - 1:
+            break
+        kept.append(i)
+    # the last point replaces a marker it would sit on
+    if len(kept) > 1 and travelled[n - 1] - travelled[kept[-1]] < spacing:
+        kept.pop()
+    kept.append(n - 1)
+    return np.array(kept)
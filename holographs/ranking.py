@@ -0,0 +1,57 @@
+import numpy as np
+
+AGGREGATES = {
+    'median': np.nanmedian,
+    'mean': np.nanmean,
+    'max': np.nanmax,
+}
+
+
+def centralityMatrix(graph, dtype = np.float64):
+    # node table rows x slices, NaN where a node is absent from a slice.
+    # float32 halves the matrix for very long series, but merges
+    # centralities that only differ in float64 (betweenness values, integers
+    # above 2^24); those ties then go to the node seen first
+    matrix = np.full((graph.nodeCount(), len(graph.slices)), np.nan, dtype=dtype)
+    for column, ts in enumerate(graph.slices):
+        matrix[ts.node_rows, column] = ts.centrality
+    return matrix
+
+
+def nodeScores(matrix, aggregate = 'median', min_presence = None, chunk_rows = 1 << 16):
+    # aggregate centrality of every node seen in at least min_presence slices
+    # (all of them by default), NaN for the rest; rows are processed in
+    # chunks so the temporaries of the nan reductions stay small
+    if min_presence is None:
+        min_presence = matrix.shape[1]
+    min_presence = max(min_presence, 1)
+    reduce = AGGREGATES[aggregate]
+
+    scores = np.full(matrix.shape[0], np.nan)
+    for start in range(0, matrix.shape[0], chunk_rows):
+        block = matrix[start:start + chunk_rows]
+        eligible = np.flatnonzero(np.count_nonzero(~np.isnan(block), axis=1) >= min_presence)
+        if len(eligible) > 0:
+            scores[start + eligible] = reduce(block[eligible], axis=1)
+    return scores
+
+
+def topK(scores, k):
+    # rows of the k highest scores, best first; equal scores keep row order,
+    # i.e. the node seen first wins, like a stable descending sort
+    candidates = np.flatnonzero(~np.isnan(scores))
+    if k <= 0:
+        return candidates[0:0]
+    if k < len(candidates):
+        values = scores[candidates]
+        threshold = values[np.argpartition(-values, k - 1)[k - 1]]
+        above = candidates[values > threshold]
+        ties = candidates[values == threshold][0:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def rankNodes(graph, k, aggregate = 'median', min_presence = None, dtype = np.float64):
+    scores = nodeScores(centralityMatrix(graph, dtype), aggregate, min_presence)
+    rows = topK(scores, k)
+    return [(graph.node_ids[row], float(scores[row])) for row in rows.tolist()]
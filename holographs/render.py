@@ -0,0 +1,859 @@
+import os
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PySide6.QtCore import Qt, QPointF, QLine, QLineF, QRect, QRectF, QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import (
+    QGuiApplication,
+    QImage,
+    QPainter,
+    QPainterPath,
+    QPaintEngine,
+    QFont,
+    QFontMetrics
+)
+
+import numpy as np
+
+from timeseries import TimeSeriesGraph, ImageMapping
+from rendercache import RenderCache, contentKey
+from pagewriter import PAGE_FORMATS, PageWriterQueue, pageFilename, openPageWriter
+from ranking import AGGREGATES, rankNodes
+from labels import placeLabels
+from paths import simplifyPath, spacedPoints
+from density import edgeDensity, toneMap
+from instrument import Instrument
+from styles import StylePool
+from layout import PageLayout, loadLayout
+from forcelayout import stabilizeLayout
+from vectorwriter import VECTOR_FORMATS
+
+HIGHLIGHT_COLORS = ['#5778a4','#e49444','#d1615d','#85b6b2','#6a9f58','#e7ca60','#a87c9f','#f1a2a9','#967662','#b8b0ac']
+
+def mapInterval(x, x_min, x_max, max,min):
+    return min + (max-min)*((x-x_min)/(x_max-x_min))
+
+def getNodeColors(graph, colors, highlighted = []):
+
+    nodes = {}
+    i = 0
+    highlighted = set(highlighted)
+    
+    # node table rows are in order of first appearance across the slices
+    for node_id in graph.node_ids:
+        if(node_id in highlighted or len(highlighted) == 0):
+            nodes[node_id] = colors[i]
+            i +=1
+            if(i >= len(colors)):i=0
+        else:
+            nodes[node_id] = '#000000'
+    return nodes
+
+
+
+
+
+def encodeImage(img, fmt = "PNG", quality = -1):
+    if fmt == "RGBA":
+        rgba = img.convertToFormat(QImage.Format.Format_RGBA8888)
+        return bytes(rgba.constBits())
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    img.save(buffer, fmt, quality)
+    buffer.close()
+    return bytes(data.data())
+
+def saveImage(img, filename, fmt = "PNG", quality = -1):
+    # QImage.save runs without the GIL, so this can overlap other work on a thread
+    if fmt == "RGBA":
+        rgba = img.convertToFormat(QImage.Format.Format_RGBA8888)
+        with open(filename, "wb") as page_file:
+            page_file.write(rgba.constBits())
+    elif not img.save(filename, fmt, quality):
+        raise IOError("could not write " + filename)
+
+def isVector(painter):
+    # PDF and SVG painters keep every call as an object in the file
+    return painter.paintEngine().type() in (QPaintEngine.Type.Pdf, QPaintEngine.Type.SVG)
+
+def writeBytes(data, filename):
+    with open(filename, "wb") as page_file:
+        page_file.write(data)
+
+def cacheImage(img, filename, fmt, quality, cache, key):
+    # encodes a page on a writer thread and keeps the bytes for the next run
+    data = encodeImage(img, fmt, quality)
+    cache.put(key, data)
+    writeBytes(data, filename)
+
+def cacheLayer(img, cache, key):
+    cache.put(key, encodeImage(img))
+
+def writeRows(writer, rgba, rows):
+    # rgba keeps the converted band alive until its rows are written
+    writer.writeRows(rgba.constBits(), rows)
+
+def pngQuality(level):
+    # Qt's PNG writer turns quality q into zlib level (100 - q) * 9 / 91
+    return 100 - (level * 91 + 8) // 9
+
+
+# state of a page rendering worker process, set once by initPageWorker
+worker_state = None
+
+def initPageWorker(renderer, graph, out, geometry, node_colors, highlight):
+    global worker_state
+    # text needs a gui application for its fonts but never a display
+    if QGuiApplication.instance() is None:
+        worker_state = [QGuiApplication(["holographs", "-platform", "offscreen"])]
+    else:
+        worker_state = [QGuiApplication.instance()]
+    worker_state += [renderer, graph, out, geometry, node_colors, highlight]
+
+def writeSheetWorker(sheet):
+    app, renderer, graph, out, geometry, node_colors, highlight = worker_state
+    filename = renderer.writeSheet(graph, sheet, out, *geometry, node_colors, highlight)
+    # the stages recorded in this process go back with the sheet
+    if renderer.instrument is not None:
+        return filename, renderer.instrument.drain()
+    return filename, []
+
+
+class GraphRenderer:
+    def __init__(self, workers = 1, cache = None, batched = True, fmt = "png", tile_height = None, base_mode = "lines", level = 6, writer_threads = 2):
+
+        self.min_line_width = 1
+        self.max_line_width = 10
+        self.min_v = 0.8
+        self.max_v = 0.2
+        self.workers = workers
+        self.cache = cache
+        # draw edges and nodes in pen buckets instead of one call each
+        self.batched = batched
+        self.fmt = fmt
+        # zlib level of PNG pages
+        self.level = level
+        # pages are encoded and written by this many background threads while
+        # the next one renders; 0 writes them in the render loop
+        self.writer_threads = writer_threads
+        self.writer = None
+        # paint pages in bands of this many rows straight into the output file
+        # instead of as whole images, for sizes a single QImage cannot hold
+        self.tile_height = tile_height
+        # "lines" draws every base layer edge, "density" shades the pixels by
+        # the summed weight of the edges crossing them
+        self.base_mode = base_mode
+        # drop or move labels that would overlap a higher ranked one
+        self.label_placement = True
+        # trajectory vertices within this many sheet pixels of the simplified
+        # path are dropped, and so are waypoint markers within a pen width of
+        # the one before; 0 draws every point
+        self.path_tolerance = 1
+        # records per stage timings and item counts when set
+        self.instrument = None
+        # pens, brushes and colors shared by all layers
+        self.styles = StylePool()
+        # page size, layers per page, pages per sheet and their rotation
+        self.layout = PageLayout()
+        # lay every slice out again from the positions in the one before,
+        # with this many simulation ticks; None keeps the file positions
+        self.stabilize = None
+
+        self.base_style = dict(node_radius = 15, edge_thickness = 3, edge_color='#cccccc',node_color='#cccccc', edge_weight_to_node_col = False, edge_weight_to_node_thickness = True, centrality_to_node_diam = False)
+        self.overlay_style = dict(node_radius = 20, edge_thickness = 1, edge_color='#666666',node_color='#666666', edge_weight_to_node_col = False, edge_weight_to_node_thickness = True, centrality_to_node_diam = False)
+
+    def stage(self, name, **args):
+        if self.instrument is None:
+            return contextlib.nullcontext()
+        return self.instrument.stage(name, **args)
+
+    def staged(self, name, draw, **args):
+        def run(painter = None):
+            with self.stage(name, **args):
+                return draw(painter)
+        return run
+
+    def countItems(self, kind, items):
+        if self.instrument is not None:
+            self.instrument.count(kind, items)
+
+    def imageMapping(self, width, height, margin_x, margin_y):
+        return ImageMapping([self.graph_x_min, self.graph_x_max, self.graph_y_min, self.graph_y_max], width, height, margin_x, margin_y)
+
+    def edgeWidths(self, ts):
+        return mapInterval(ts.weight, self.edge_weight_min, self.edge_weight_max, self.max_line_width, self.min_line_width)
+
+    def edgeValues(self, ts):
+        return mapInterval(ts.weight, self.edge_weight_min, self.edge_weight_max, self.max_v, self.min_v)
+
+    def beginLayer(self, width, height, painter = None):
+        # a layer paints into its own image, or into the painter of a tiled
+        # page band that is already translated and clipped to the layer
+        img = None
+        if painter is None:
+            img = QImage(width,height,QImage.Format.Format_ARGB32)
+            painter = QPainter()
+            painter.begin(img)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
+        painter.setBrush(Qt.GlobalColor.white)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.drawRect(0,0,width,height)
+        return img, painter
+
+    def endLayer(self, img, painter):
+        if img is not None:
+            painter.end()
+        return img
+
+    def visible(self, painter, x1, y1, x2, y2, pad):
+        # indices of the shapes whose bounding box, grown by pad, reaches into
+        # the clip region; everything when the painter is not clipped
+        if not painter.hasClipping():
+            return None
+        clip = painter.clipBoundingRect()
+        keep = (np.maximum(x1, x2) >= clip.left() - pad) & (np.minimum(x1, x2) <= clip.right() + pad)
+        keep &= (np.maximum(y1, y2) >= clip.top() - pad) & (np.minimum(y1, y2) <= clip.bottom() + pad)
+        return np.flatnonzero(keep)
+    # white
+    def pathTolerance(self):
+        # layers are drawn at layout.scale on the sheet, so a sheet pixel is
+        # 1 / scale layer pixels
+        return self.path_tolerance / self.layout.scale
+
+    def getLineOverlay(self, graph, width, height, margin_x, margin_y, node_colors, highlight = [], painter = None):    
+
+        mapping = self.imageMapping(width, height, margin_x, margin_y)
+    
+        line_width= 50
+
+        img, painter = self.beginLayer(width, height, painter)
+        circle_pen = self.styles.pen("#FFFFFF")
+        line_brush = self.styles.brush("#FFFFFF")
+        
+        painter.setFont(QFont("Helvetica", 20))
+        # pen.set
+        
+
+        rows, offsets, px, py = graph.trajectories(mapping)
+        if len(highlight) > 0:
+            drawn = np.flatnonzero(graph.highlightMask(highlight)[rows])
+        else:
+            drawn = np.arange(len(rows))
+        if len(drawn) > 0:
+            # only the trajectories reaching into a tiled band
+            keep = self.visible(painter, np.minimum.reduceat(px, offsets[:-1])[drawn], np.minimum.reduceat(py, offsets[:-1])[drawn], np.maximum.reduceat(px, offsets[:-1])[drawn], np.maximum.reduceat(py, offsets[:-1])[drawn], line_width)
+            if keep is not None:
+                drawn = drawn[keep]
+        spacing = line_width if self.path_tolerance > 0 else 0
+
+        painter.setOpacity(0.5)
+        for k in drawn.tolist():
+                node_id = graph.node_ids[rows[k]]
+                x = px[offsets[k]:offsets[k + 1]]
+                y = py[offsets[k]:offsets[k + 1]]
+                vertices = simplifyPath(x, y, self.pathTolerance())
+                painter.setPen(self.styles.pen(node_colors[node_id], line_width, Qt.PenCapStyle.RoundCap, Qt.PenJoinStyle.RoundJoin))
+
+                painter.drawPolyline(list(map(QPointF, x[vertices].tolist(), y[vertices].tolist())))
+                self.countItems("vertices", len(vertices))
+
+                painter.setPen(circle_pen)
+                painter.setBrush(line_brush)
+
+                markers = spacedPoints(x, y, spacing)
+                self.countItems("markers", len(markers))
+                for point in map(QPointF, x[markers].tolist(), y[markers].tolist()):
+                    painter.drawEllipse(point, line_width/2,line_width/2)
+            
+        return self.endLayer(img, painter)
+
+    def getLableOverlay(self, graph, width, height, margin_x, margin_y, node_colors, highlight = [], painter = None):    
+
+        mapping = self.imageMapping(width, height, margin_x, margin_y)
+    
+        line_width= 50
+
+        img, painter = self.beginLayer(width, height, painter)
+        shadow_pen = self.styles.pen('#666666')
+        
+        painter.setFont(QFont("Helvetica", 20))
+        # pen.set
+        
+
+        rows, offsets, px, py = graph.trajectories(mapping)
+        # label every highlighted node seen in more than one slice at its last position
+        last = offsets[1:] - 1
+        labelled = (offsets[1:] - offsets[:-1]) > 1
+        if len(highlight) > 0:
+            labelled &= graph.highlightMask(highlight)[rows]
+        rows = rows[labelled]
+        px = px[last[labelled]]
+        py = py[last[labelled]]
+
+        if self.label_placement:
+            # highlighted nodes in rank order, otherwise by the centrality of
+            # their last appearance
+            if len(highlight) > 0:
+                rank = {node_id: i for i, node_id in enumerate(highlight)}
+                priority = [-rank[graph.node_ids[row]] for row in rows.tolist()]
+            else:
+                centrality = np.zeros(graph.nodeCount())
+                for ts in graph.slices:
+                    centrality[ts.node_rows] = ts.centrality
+                priority = centrality[rows]
+            metrics = QFontMetrics(painter.font(), painter.device())
+            widths = [metrics.horizontalAdvance(graph.node_names[row]) for row in rows.tolist()]
+            placed, px, py = placeLabels(px, py, widths, metrics.ascent(), metrics.descent(), priority)
+            rows = rows[placed]
+        rows = rows.tolist()
+        px = list(px)
+        py = list(py)
+
+        self.countItems("labels", len(rows))
+        painter.setOpacity(1)
+        for k in range(len(rows)):
+            node_id = graph.node_ids[rows[k]]
+            name = graph.node_names[rows[k]]
+            painter.setPen(shadow_pen)            
+            painter.drawText(px[k] + 1,py[k]+ 1,name)   
+            painter.setPen(self.styles.pen(node_colors[node_id]))                
+            painter.drawText(px[k],py[k],name)   
+
+        
+        return self.endLayer(img, painter)
+
+    def getTimesliceOverlay(self, graph, ts, width, height, margin_x, margin_y, node_colors, highlight = [],node_radius = 20, edge_thickness = 1, edge_color='#666666',node_color='#666666', edge_weight_to_node_col = False, edge_weight_to_node_thickness = True, centrality_to_node_diam = False, painter = None):
+
+        px, py = ts.imageCoords(self.imageMapping(width, height, margin_x, margin_y))
+        node_hl = graph.highlightMask(highlight)[ts.node_rows]
+        edge_hl = node_hl[ts.edge_source] & node_hl[ts.edge_target]
+        
+
+        # white
+        img, painter = self.beginLayer(width, height, painter)
+        # overlay edges are 3 pixels wide whatever edge_thickness says
+        edge_thickness = 3
+        painter.setPen(self.styles.pen(edge_color, edge_thickness))
+        # line_pen.setColor(QColor(0x66, 0x66, 0x66, 0x40))
+        # painter.drawRect(img_x_min,img_y_min,img_x_max-margin_x,img_y_max-margin_y)
+
+        # print(img_x_max,img_x_min,img_y_max,img_y_min)
+
+        painter.setOpacity(1)
+        edges = np.flatnonzero(edge_hl)
+        self.drawEdges(painter, edge_color, edge_thickness, px[ts.edge_source[edges]], py[ts.edge_source[edges]], px[ts.edge_target[edges]], py[ts.edge_target[edges]], self.edgeValues(ts)[edges], self.edgeWidths(ts)[edges], edge_weight_to_node_col, edge_weight_to_node_thickness)
+        nodes = np.flatnonzero(node_hl)
+        colors = [node_colors[graph.node_ids[row]] for row in ts.node_rows[nodes].tolist()]
+        self.drawNodes(painter, px[nodes] - node_radius, py[nodes] - node_radius, 2*node_radius, colors)
+            
+        return self.endLayer(img, painter)
+
+    def getImg(self, graph, ts, width, height, margin_x, margin_y, node_colors, highlight = [], node_radius = 15, edge_thickness = 3, edge_color='#cccccc',node_color='#cccccc', edge_weight_to_node_col = False, edge_weight_to_node_thickness = True, centrality_to_node_diam = False, painter = None):
+        px, py = ts.imageCoords(self.imageMapping(width, height, margin_x, margin_y))
+        node_hl = graph.highlightMask(highlight)[ts.node_rows]
+        edge_hl = node_hl[ts.edge_source] & node_hl[ts.edge_target]
+        
+
+        # white
+        img, painter = self.beginLayer(width, height, painter)
+        painter.setPen(self.styles.pen(edge_color, edge_thickness))
+        # line_pen.setColor(QColor(0x66, 0x66, 0x66, 0x40))
+        # painter.drawRect(img_x_min,img_y_min,img_x_max-margin_x,img_y_max-margin_y)
+
+        # print(img_x_max,img_x_min,img_y_max,img_y_min)
+
+        edges = np.flatnonzero(~edge_hl)
+        if self.base_mode == "density":
+            self.drawDensity(painter, width, height, px[ts.edge_source[edges]], py[ts.edge_source[edges]], px[ts.edge_target[edges]], py[ts.edge_target[edges]], ts.weight[edges], self.styles.color(edge_color))
+        else:
+            self.drawEdges(painter, edge_color, edge_thickness, px[ts.edge_source[edges]], py[ts.edge_source[edges]], px[ts.edge_target[edges]], py[ts.edge_target[edges]], self.edgeValues(ts)[edges], self.edgeWidths(ts)[edges], edge_weight_to_node_col, edge_weight_to_node_thickness)
+        nodes = np.flatnonzero(~node_hl)
+        self.drawNodes(painter, px[nodes] - node_radius, py[nodes] - node_radius, 2*node_radius, [node_color] * len(nodes))
+            
+        return self.endLayer(img, painter)
+
+    def drawEdges(self, painter, edge_color, edge_thickness, x1, y1, x2, y2, values, widths, edge_weight_to_node_col, edge_weight_to_node_thickness):
+        if len(x1) > 0:
+            keep = self.visible(painter, x1, y1, x2, y2, widths.max() + 2)
+            if keep is not None:
+                x1, y1, x2, y2, values, widths = x1[keep], y1[keep], x2[keep], y2[keep], values[keep], widths[keep]
+        self.countItems("edges", len(x1))
+        if not self.batched:
+            vector = isVector(painter)
+            x1 = x1.tolist()
+            y1 = y1.tolist()
+            x2 = x2.tolist()
+            y2 = y2.tolist()
+            values = values.tolist()
+            widths = widths.tolist()
+            for e in range(len(x1)):
+                color = values[e] if edge_weight_to_node_col else edge_color
+                width = widths[e] if edge_weight_to_node_thickness else edge_thickness
+                painter.setPen(self.styles.pen(color, width))
+                if vector:
+                    painter.drawLine(QLineF(x1[e],y1[e],x2[e],y2[e]))
+                else:
+                    painter.drawLine(x1[e],y1[e],x2[e],y2[e])
+            return
+
+        if len(x1) == 0:
+            return
+        # bucket edges by the pen they end up with: setWidth keeps whole pixels
+        # and QColor stores the hsv value in 16 bits, so these keys are exact.
+        # Overlapping antialiased edges from different buckets blend in another
+        # order, which can move those pixels by one level; batched=False keeps
+        # the per edge drawing order
+        key = np.zeros(len(x1), dtype=np.int64)
+        if(edge_weight_to_node_thickness):
+            key += widths.astype(np.int64) << 16
+        if(edge_weight_to_node_col):
+            key += np.rint(values * 65535).astype(np.int64)
+        order = np.argsort(key, kind="stable")
+        buckets = np.split(order, np.flatnonzero(np.diff(key[order])) + 1)
+
+        vector = isVector(painter)
+        if not vector:
+            # drawLine(x1, y1, x2, y2) truncates to integer coordinates, keep
+            # that; PDF and SVG keep the exact positions for any print size
+            x1 = x1.astype(np.int64)
+            y1 = y1.astype(np.int64)
+            x2 = x2.astype(np.int64)
+            y2 = y2.astype(np.int64)
+        for bucket in buckets:
+            first = bucket[0]
+            color = float(values[first]) if edge_weight_to_node_col else edge_color
+            width = widths[first] if edge_weight_to_node_thickness else edge_thickness
+            pen = self.styles.pen(color, width)
+            if vector:
+                # one path object per bucket instead of a line object per edge
+                path = QPainterPath()
+                for a, b, c, d in zip(x1[bucket].tolist(), y1[bucket].tolist(), x2[bucket].tolist(), y2[bucket].tolist()):
+                    path.moveTo(a, b)
+                    path.lineTo(c, d)
+                painter.strokePath(path, pen)
+                continue
+            painter.setPen(pen)
+            painter.drawLines(list(map(QLine, x1[bucket].tolist(), y1[bucket].tolist(), x2[bucket].tolist(), y2[bucket].tolist())))
+
+    def drawDensity(self, painter, width, height, x1, y1, x2, y2, weight, edge_color):
+        # only the rows a tiled band shows are accumulated
+        top = 0
+        rows = height
+        if painter.hasClipping():
+            clip = painter.clipBoundingRect()
+            top = max(int(np.floor(clip.top())), 0)
+            rows = min(int(np.ceil(clip.top() + clip.height())), height) - top
+        if rows <= 0:
+            return
+        self.countItems("edges", len(x1))
+        # the lightest edge gets edge_color, heavier and crossing ones darker
+        # up to black where the heaviest edge of the series passed
+        scale = self.edge_weight_min if self.edge_weight_min > 0 else 1
+        rgba = toneMap(edgeDensity(x1, y1, x2, y2, weight, width, rows, top), scale, self.edge_weight_max, edge_color.getRgb()[0:3])
+        painter.drawImage(0, top, QImage(rgba.data, width, rows, width * 4, QImage.Format.Format_RGBA8888))
+
+    def drawNodes(self, painter, x, y, diameter, colors):
+        keep = self.visible(painter, x, y, x + diameter, y + diameter, 2)
+        if keep is not None:
+            x, y, colors = x[keep], y[keep], [colors[i] for i in keep.tolist()]
+        self.countItems("nodes", len(x))
+        if not self.batched:
+            vector = isVector(painter)
+            x = x.tolist()
+            y = y.tolist()
+            for i in range(len(x)):
+                painter.setBrush(self.styles.brush(colors[i]))
+                painter.setPen(self.styles.pen(colors[i]))
+                if vector:
+                    painter.drawEllipse(QRectF(x[i],y[i], diameter, diameter))
+                else:
+                    painter.drawEllipse(x[i],y[i], diameter, diameter)
+            return
+
+        # nodes keep their order so overlaps look the same, the pen and brush
+        # only change between runs of equally colored nodes
+        if isVector(painter):
+            # a run becomes one path object; pen and brush share the color,
+            # so outlines over overlapping fills do not show. Positions are
+            # not rounded to layer pixels
+            x = x.tolist()
+            y = y.tolist()
+            start = 0
+            for i in range(1, len(x) + 1):
+                if i == len(x) or colors[i] != colors[start]:
+                    path = QPainterPath()
+                    path.setFillRule(Qt.FillRule.WindingFill)
+                    for j in range(start, i):
+                        path.addEllipse(x[j], y[j], diameter, diameter)
+                    painter.setBrush(self.styles.brush(colors[start]))
+                    painter.setPen(self.styles.pen(colors[start]))
+                    painter.drawPath(path)
+                    start = i
+            return
+        rects = list(map(QRect, x.astype(np.int64).tolist(), y.astype(np.int64).tolist(), [int(diameter)] * len(x), [int(diameter)] * len(x)))
+        current = None
+        for i in range(len(rects)):
+            if colors[i] != current:
+                current = colors[i]
+                painter.setBrush(self.styles.brush(current))
+                painter.setPen(self.styles.pen(current))
+            painter.drawEllipse(rects[i])
+
+    def drawStuff(self, path = "Data/HP/v2/", out = ".", ppmm = 10, top_k = 10, stream = False, rank_by = "median", min_presence = None):
+        
+        colors = HIGHLIGHT_COLORS
+
+
+        # every slice is parsed exactly once and shared by all layers below
+        with self.stage("load", path=path):
+            graph = TimeSeriesGraph(path, stream)
+            self.countItems("slices", len(graph.slices))
+        print(graph.files_read, "files read from", path)
+
+        if self.stabilize is not None:
+            with self.stage("stabilize"):
+                relaxed = stabilizeLayout(graph, self.stabilize)
+                self.countItems("nodes", sum(moved for name, moved, nodes in relaxed))
+        
+        with self.stage("bounds"):
+            [self.graph_x_min, self.graph_x_max, self.graph_y_min, self.graph_y_max, self.centrality_min, self.centrality_max, self.edge_weight_min, self.edge_weight_max] = graph.bounds()
+
+        # highlight the nodes with the highest centrality over the slices they
+        # appear in; by default only nodes present in every slice are ranked
+        with self.stage("ranking"):
+            ranks = rankNodes(graph, top_k, rank_by, min_presence)
+        print(ranks)
+        highlight_nodes = [x[0] for x in ranks]
+        print(len(highlight_nodes), highlight_nodes)
+        with self.stage("colors"):
+            node_colors = getNodeColors(graph, colors, highlight_nodes)
+
+        for node in highlight_nodes:
+            print(node_colors[node])
+        geometry = self.layout.geometry(ppmm)
+        width, height, margin_x, margin_y = geometry
+        os.makedirs(out, exist_ok=True)
+
+        # one page per slice plus the trajectory/label page, laid out on sheets
+        sheet_count = self.layout.sheetCount(len(graph.slices) + 1)
+        if self.fmt in VECTOR_FORMATS:
+            # one PDF for all sheets, so these are always written in order
+            self.writeVectorSheets(graph, sheet_count, out, ppmm, width, height, margin_x, margin_y, node_colors, highlight_nodes)
+        elif self.workers > 1:
+            # slices are independent once bounds and colors are known; each
+            # worker paints and writes its own sheets
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=initPageWorker, initargs=(self, graph, out, geometry, node_colors, highlight_nodes)) as pool:
+                for filename, events in pool.map(writeSheetWorker, range(1, sheet_count + 1)):
+                    if self.instrument is not None:
+                        self.instrument.merge(events)
+        else:
+            # worker processes write synchronously, they already overlap
+            if self.writer_threads > 0:
+                self.writer = PageWriterQueue(self.writer_threads)
+            try:
+                for sheet in range(1, sheet_count + 1):
+                    self.writeSheet(graph, sheet, out, width, height, margin_x, margin_y, node_colors, highlight_nodes)
+            finally:
+                if self.writer is not None:
+                    writer = self.writer
+                    self.writer = None
+                    with self.stage("drain"):
+                        writer.close()
+        if self.cache is not None and self.workers <= 1:
+            print(self.cache.hits, "cache hits,", self.cache.misses, "misses")
+
+    def pageLayers(self, graph, pg, width, height, margin_x, margin_y, node_colors, highlight = []):
+        # cache keys and draw functions of the top and bottom layer of a page;
+        # a draw function paints into the given painter or its own image
+        geometry = (width, height, margin_x, margin_y)
+        if pg <= len(graph.slices):
+            ts = graph.slices[pg - 1]
+            img_key = self.layerKey("getImg", [ts], geometry, node_colors, highlight, dict(self.base_style, base_mode = self.base_mode))
+            ol_key = self.layerKey("getTimesliceOverlay", [ts], geometry, node_colors, highlight, self.overlay_style)
+            draw_img = self.staged("getImg", lambda painter: self.getImg(graph, ts, width, height, margin_x, margin_y,node_colors, highlight, **self.base_style, painter = painter), slice=ts.name)
+            draw_ol = self.staged("getTimesliceOverlay", lambda painter: self.getTimesliceOverlay(graph, ts, width, height, margin_x, margin_y,node_colors, highlight, **self.overlay_style, painter = painter), slice=ts.name)
+        else:
+            # the trajectory and label layers depend on every slice
+            img_key = self.layerKey("getLineOverlay", graph.slices, geometry, node_colors, highlight, dict(path_tolerance = self.pathTolerance()))
+            ol_key = self.layerKey("getLableOverlay", graph.slices, geometry, node_colors, highlight, dict(label_placement = self.label_placement))
+            draw_img = self.staged("getLineOverlay", lambda painter: self.getLineOverlay(graph, width, height, margin_x, margin_y,node_colors,highlight, painter))
+            draw_ol = self.staged("getLableOverlay", lambda painter: self.getLableOverlay(graph, width, height, margin_x, margin_y,node_colors,highlight, painter))
+        return img_key, ol_key, draw_img, draw_ol
+
+    def sheetCells(self, graph, sheet, width, height, margin_x, margin_y, node_colors, highlight = []):
+        # the page number of every cell on a sheet with the cache keys and
+        # draw functions of its layers, in layout order
+        layout = self.layout
+        cells = []
+        for pg in layout.sheetPages(sheet, len(graph.slices) + 1):
+            img_key, ol_key, draw_img, draw_ol = self.pageLayers(graph, pg, width, height, margin_x, margin_y, node_colors, highlight)
+            layers = {"base": (img_key, draw_img), "overlay": (ol_key, draw_ol)}
+            cells.append((pg, [layers[name] for name in layout.layers]))
+        return cells
+
+    def writeSheet(self, graph, sheet, out, width, height, margin_x, margin_y, node_colors, highlight = []):
+        filename = pageFilename(out, sheet, self.fmt)
+        with self.stage("page", sheet=sheet):
+            cells = self.sheetCells(graph, sheet, width, height, margin_x, margin_y, node_colors, highlight)
+            if self.tile_height is not None:
+                self.writeSheetTiled(cells, filename, width, height, margin_x, margin_y)
+            elif self.writer is not None:
+                self.queueSheet(cells, filename, width, height, margin_x, margin_y)
+            else:
+                data = self.renderSheet(cells, width, height, margin_x, margin_y)
+                with self.stage("write"):
+                    writeBytes(data, filename)
+                    self.countItems("bytes", len(data))
+        return filename
+
+    def writeVectorSheets(self, graph, sheet_count, out, ppmm, width, height, margin_x, margin_y, node_colors, highlight = []):
+        # the layers paint straight into a PDF or SVG painter, so the files
+        # hold the edges, nodes and labels as shapes and text at any print
+        # size; only the density base layer is embedded as an image
+        sheet_width, sheet_height = self.layout.sheetSize(width, height)
+        writer = VECTOR_FORMATS[self.fmt](out, sheet_width, sheet_height, ppmm)
+        try:
+            for sheet in range(1, sheet_count + 1):
+                with self.stage("page", sheet=sheet):
+                    cells = self.sheetCells(graph, sheet, width, height, margin_x, margin_y, node_colors, highlight)
+                    painter = writer.beginSheet(sheet)
+                    self.paintSheet(painter, cells, 0, sheet_height, width, height, margin_x, margin_y)
+                    writer.endSheet()
+        finally:
+            writer.close()
+
+    def quality(self):
+        if self.fmt == "png":
+            return pngQuality(self.level)
+        return -1
+
+    def queueSheet(self, cells, filename, width, height, margin_x, margin_y):
+        # encoding happens on the writer threads, and with a cache so does
+        # encoding the missing layers and keeping them and the page in it
+        fmt = PAGE_FORMATS[self.fmt][0]
+        if self.cache is None:
+            page = self.composeSheet(cells, width, height, margin_x, margin_y)
+            with self.stage("queue"):
+                self.writer.submit(saveImage, page, filename, fmt, self.quality())
+            return
+        sheet_key = self.sheetKey(cells)
+        data = self.cache.get(sheet_key)
+        if data is not None:
+            with self.stage("queue"):
+                self.writer.submit(writeBytes, data, filename)
+                self.countItems("bytes", len(data))
+            return
+        cells = [(pg, [(key, self.cachedDraw(key, draw)) for key, draw in layers]) for pg, layers in cells]
+        page = self.composeSheet(cells, width, height, margin_x, margin_y)
+        with self.stage("queue"):
+            self.writer.submit(cacheImage, page, filename, fmt, self.quality(), self.cache, sheet_key)
+
+    def renderSheet(self, cells, width, height, margin_x, margin_y):
+        fmt = PAGE_FORMATS[self.fmt][0]
+
+        if self.cache is None:
+            return self.encodePage(self.composeSheet(cells, width, height, margin_x, margin_y), fmt)
+
+        sheet_key = self.sheetKey(cells)
+        data = self.cache.get(sheet_key)
+        if data is None:
+            cells = [(pg, [(key, self.cachedDraw(key, draw)) for key, draw in layers]) for pg, layers in cells]
+            data = self.encodePage(self.composeSheet(cells, width, height, margin_x, margin_y), fmt)
+            self.cache.put(sheet_key, data)
+        return data
+
+    def sheetKey(self, cells):
+        return contentKey("page", self.fmt, self.level, self.layout.spec(), [[pg, [key for key, draw in layers]] for pg, layers in cells])
+
+    def encodePage(self, page, fmt):
+        with self.stage("encode", format=fmt):
+            return encodeImage(page, fmt, self.quality())
+
+    def handOff(self, function, *args, after = None):
+        # runs on the writer threads in order after the job after, or right
+        # here when there are none
+        if self.writer is None:
+            function(*args)
+            return None
+        return self.writer.submit(function, *args, after=after)
+
+    def writeSheetTiled(self, cells, filename, width, height, margin_x, margin_y):
+        # the same sheet as composeSheet, painted one band of rows at a time
+        # and handed to the writer threads, which filter, compress and write
+        # it while the next one is painted. Nodes, text, images and lines
+        # inside one band match the untiled sheet exactly; a line crossing a
+        # band edge does not. Qt clips it to the band and rasterizes it again
+        # from the clipped end, so its whole part inside the band can move:
+        # 1 pixel edges shift by a pixel (up to ~150 levels), wider ones
+        # change by a few levels. An overdraw margin around the band does not
+        # help, the line is still clipped somewhere
+        tiled_key = None
+        if self.cache is not None:
+            # the cache keeps the finished file; its pixels differ from the
+            # untiled sheet's, so it has a key of its own
+            tiled_key = contentKey("tiled", self.tile_height, self.sheetKey(cells))
+            if self.cache.getFile(tiled_key, filename):
+                return
+        sheet_width, sheet_height = self.layout.sheetSize(width, height)
+        writer = openPageWriter(filename, self.fmt, sheet_width, sheet_height, self.level)
+        done = None
+        try:
+            for y0 in range(0, sheet_height, self.tile_height):
+                rows = min(self.tile_height, sheet_height - y0)
+                done = self.writeBand(writer, cells, y0, rows, width, height, margin_x, margin_y, done)
+        finally:
+            done = self.handOff(writer.close, after=done)
+        if tiled_key is not None:
+            self.handOff(self.cache.putFile, tiled_key, filename, after=done)
+
+    def writeBand(self, writer, cells, y0, rows, width, height, margin_x, margin_y, after = None):
+        with self.stage("band", y=y0):
+            sheet_width, sheet_height = self.layout.sheetSize(width, height)
+            band = QImage(sheet_width,rows,QImage.Format.Format_ARGB32)
+            band.fill(Qt.GlobalColor.white)
+            painter = QPainter()
+            painter.begin(band)
+            self.paintSheet(painter, cells, y0, rows, width, height, margin_x, margin_y)
+            painter.end()
+
+            rgba = band.convertToFormat(QImage.Format.Format_RGBA8888)
+        with self.stage("write" if self.writer is None else "queue", y=y0):
+            return self.handOff(writeRows, writer, rgba, rows, after=after)
+
+    def paintSheet(self, painter, cells, y0, rows, width, height, margin_x, margin_y):
+        # rows y0 to y0 + rows of a sheet: every layer is drawn straight into
+        # the painter, moved into its cell and clipped to it, so only the
+        # edges and nodes reaching into the band are drawn and no layer image
+        # is kept. Layers outside the band are skipped
+        sheet_width, sheet_height = self.layout.sheetSize(width, height)
+        band = QRectF(0, y0, sheet_width, rows)
+        painter.translate(0, -y0)
+        painter.setClipRect(0, y0, sheet_width, rows)
+        for index, (pg, layers) in enumerate(cells):
+            cell = self.layout.cellTransform(index, width, height)
+            for j, (key, draw) in enumerate(layers):
+                if not cell.mapRect(QRectF(0, j * height, width, height)).intersects(band):
+                    continue
+                painter.save()
+                painter.setTransform(cell, True)
+                painter.translate(0, j * height)
+                painter.setClipRect(0, 0, width, height, Qt.ClipOperation.IntersectClip)
+                painter.save()
+                draw(painter)
+                painter.restore()
+                # the page number goes on every layer, with the painter
+                # state a fresh layer image would have
+                painter.drawText(margin_x,margin_y,str(pg))
+                painter.restore()
+
+            stack = len(layers) * height
+            painter.save()
+            painter.setTransform(cell, True)
+            painter.setPen(Qt.GlobalColor.black)
+            painter.drawLine(0,1,width,1)
+            for j in range(1, len(layers)):
+                painter.drawLine(0,j * height,width,j * height)
+            painter.drawLine(0,stack -1 ,width,stack -1)
+            painter.restore()
+
+    def layerKey(self, name, slices, geometry, node_colors, highlight, style = {}):
+        # everything a layer's pixels depend on; a changed slice file only
+        # invalidates the layers drawn from it
+        if self.cache is None:
+            return None
+        bounds = [self.graph_x_min, self.graph_x_max, self.graph_y_min, self.graph_y_max, self.centrality_min, self.centrality_max, self.edge_weight_min, self.edge_weight_max]
+        widths = [self.min_line_width, self.max_line_width, self.min_v, self.max_v]
+        if len(highlight) > 0:
+            colors = [[str(node_id), node_colors.get(node_id)] for node_id in highlight]
+        else:
+            colors = sorted([str(node_id), color] for node_id, color in node_colors.items())
+        return contentKey(name, [ts.digest for ts in slices], bounds, widths, geometry, sorted(str(node_id) for node_id in highlight), colors, style)
+
+    def cachedLayer(self, key, draw):
+        data = self.cache.get(key)
+        if data is not None:
+            return QImage.fromData(data, "PNG")
+        img = draw()
+        # encoded on the writer threads while the sheet is composed from it
+        self.handOff(cacheLayer, img, self.cache, key)
+        return img
+
+    def cachedDraw(self, key, draw):
+        return lambda painter: painter.drawImage(0, 0, self.cachedLayer(key, draw))
+
+    def composeSheet(self, cells, width, height, margin_x, margin_y):
+        with self.stage("compose", pages=len(cells)):
+            sheet_width, sheet_height = self.layout.sheetSize(width, height)
+            page = QImage(sheet_width,sheet_height,QImage.Format.Format_ARGB32)
+            page.fill(Qt.GlobalColor.white)
+            painter = QPainter()
+            painter.begin(page)
+            self.paintSheet(painter, cells, 0, sheet_height, width, height, margin_x, margin_y)
+            painter.end()
+            return page
+
+    def composePage(self, img, ol, pg, width, height, margin_x, margin_y):
+        # a single page from layer images drawn beforehand
+        layers = {"base": img, "overlay": ol}
+        cells = [(pg, [(None, lambda painter, layer = layers[name]: painter.drawImage(0, 0, layer)) for name in self.layout.layers])]
+        return self.composeSheet(cells, width, height, margin_x, margin_y)
+
+
+def main(argv = None):
+    # headless batch rendering: no widgets, no event loop, no display server
+    parser = argparse.ArgumentParser(description="Render one page per timeslice plus a trajectory page.")
+    parser.add_argument("--input", default="data/", help="directory with one JSON file per timeslice, or a binary file written by timeseries.py")
+    parser.add_argument("--out", default=".", help="directory the page_N files are written to")
+    parser.add_argument("--ppmm", type=int, default=10, help="pixels per millimetre of the A5 page")
+    parser.add_argument("--top-k", type=int, default=10, help="number of highest ranked nodes to highlight")
+    parser.add_argument("--rank-by", default="median", choices=sorted(AGGREGATES), help="how a node's centrality is aggregated over the slices for ranking")
+    parser.add_argument("--min-presence", type=int, default=None, help="only rank nodes present in at least this many slices (default: all of them)")
+    parser.add_argument("--stream", action="store_true", help="parse slices incrementally instead of loading each JSON document whole")
+    parser.add_argument("--stabilize", type=int, default=None, metavar="TICKS", help="lay each slice out again warm started from the previous one, relaxing only changed nodes for this many ticks")
+    parser.add_argument("--workers", type=int, default=1, help="render pages in this many processes")
+    parser.add_argument("--cache", default=None, help="directory for cached layers and pages; unchanged slices are not re-rendered")
+    parser.add_argument("--cache-size", type=int, default=2048, help="cache size limit in MB, least recently used entries are evicted first")
+    parser.add_argument("--format", default="png", choices=sorted(PAGE_FORMATS) + sorted(VECTOR_FORMATS), help="image format of the pages; pdf writes every page into one pages.pdf, svg one file per page")
+    parser.add_argument("--level", type=int, default=6, choices=range(10), metavar="0-9", help="zlib compression level of PNG pages")
+    parser.add_argument("--writer-threads", type=int, default=2, help="threads encoding and writing pages while the next one renders, 0 to write in the render loop")
+    parser.add_argument("--tile-height", type=int, default=None, help="paint and write pages in bands of this many rows, for print resolutions too large for one image")
+    parser.add_argument("--layout", default=None, help="page layout as a JSON object or a file holding one, with the arguments of layout.PageLayout, e.g. '{\"columns\": 5, \"rows\": 4, \"scale\": 0.2}'")
+    parser.add_argument("--base", default="lines", choices=["lines", "density"], help="draw the base layer edges one by one, or as a density raster of their weights")
+    parser.add_argument("--timings", action="store_true", help="print wall/CPU time, peak memory and drawn items per stage")
+    parser.add_argument("--trace", default=None, help="write the recorded stages to this file as a Chrome trace (chrome://tracing, Perfetto)")
+    parser.add_argument("--profile", default=None, help="run under cProfile and write the stats to this file (read with pstats or snakeviz)")
+    parser.add_argument("--trace-memory", action="store_true", help="record the peak Python allocation of every stage with tracemalloc")
+    args = parser.parse_args(argv)
+
+    app = QGuiApplication.instance()
+    if app is None:
+        app = QGuiApplication(["holographs", "-platform", "offscreen"])
+
+    cache = None
+    if args.cache is not None:
+        cache = RenderCache(args.cache, args.cache_size * 1024 * 1024)
+
+    renderer = GraphRenderer(args.workers, cache, fmt=args.format, tile_height=args.tile_height, base_mode=args.base, level=args.level, writer_threads=args.writer_threads)
+    if args.layout is not None:
+        renderer.layout = loadLayout(args.layout)
+    renderer.stabilize = args.stabilize
+    if args.timings or args.trace or args.profile or args.trace_memory:
+        renderer.instrument = Instrument(args.profile is not None, args.trace_memory)
+        renderer.instrument.start()
+
+    with renderer.stage("drawStuff"):
+        renderer.drawStuff(args.input, args.out, args.ppmm, args.top_k, args.stream, args.rank_by, args.min_presence)
+
+    if renderer.instrument is not None:
+        renderer.instrument.stop()
+        print(renderer.instrument.summary())
+        if args.trace is not None:
+            renderer.instrument.writeTrace(args.trace)
+        if args.profile is not None:
+            renderer.instrument.writeProfile(args.profile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+
+def contentKey(*parts):
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    # encoded layers and pages on disk, keyed by a hash of everything that
+    # went into drawing them and evicted least recently used first
+    def __init__(self, directory, max_bytes = 2048 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.evict()
+
+    def entryPath(self, key):
+        return os.path.join(self.directory, key + ".png")
+
+    def get(self, key):
+        path = self.entryPath(key)
+        try:
+            with open(path, "rb") as entry:
+                data = entry.read()
+            # the modification time doubles as the last use for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        # write then rename so other worker processes never see half an entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as entry:
+            entry.write(data)
+        os.replace(tmp, self.entryPath(key))
+        self.evict()
+
+    def getFile(self, key, filename):
+        # copies an entry to filename without reading it into memory, for
+        # pages written in bands; False when there is none
+        path = self.entryPath(key)
+        try:
+            shutil.copyfile(path, filename)
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def putFile(self, key, filename):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(filename, tmp)
+        os.replace(tmp, self.entryPath(key))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".png"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,55 @@
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QBrush, QColor, QPen
+
+
+class StylePool:
+    # QColor, QPen and QBrush objects built once and shared by every layer,
+    # instead of new ones for every node and edge drawn. Colors are anything
+    # QColor takes, or a float for the grey of that hsv value. The objects are
+    # shared, never change them; painter.setPen and setBrush copy them anyway
+    def __init__(self):
+        self.colors = {}
+        self.pens = {}
+        self.brushes = {}
+
+    def __getstate__(self):
+        # Qt objects do not pickle, worker processes build their own
+        return {'colors': {}, 'pens': {}, 'brushes': {}}
+
+    def colorKey(self, spec):
+        if isinstance(spec, float):
+            # QColor keeps hsv values in 16 bits, so this key is exact
+            return ('value', int(round(spec * 65535)))
+        return spec
+
+    def color(self, spec):
+        key = self.colorKey(spec)
+        color = self.colors.get(key)
+        if color is None:
+            if isinstance(key, tuple):
+                color = QColor()
+                color.setHsvF(1, 0, key[1] / 65535, 1)
+            else:
+                color = QColor(spec)
+            self.colors[key] = color
+        return color
+
+    def pen(self, spec, width = 1, cap = Qt.PenCapStyle.SquareCap, join = Qt.PenJoinStyle.BevelJoin):
+        # widths are whole pixels, like QPen.setWidth makes them
+        key = (self.colorKey(spec), int(width), cap, join)
+        pen = self.pens.get(key)
+        if pen is None:
+            pen = QPen(self.color(spec))
+            pen.setWidth(int(width))
+            pen.setCapStyle(cap)
+            pen.setJoinStyle(join)
+            self.pens[key] = pen
+        return pen
+
+    def brush(self, spec):
+        key = self.colorKey(spec)
+        brush = self.brushes.get(key)
+        if brush is None:
+            brush = QBrush(self.color(spec))
+            self.brushes[key] = brush
+        return brush
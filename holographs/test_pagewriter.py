@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from PySide6.QtGui import QImage
+
+from pagewriter import PngStreamWriter, RawStreamWriter, TiffStreamWriter, openPageWriter
+
+
+def randomPage(width, height, seed = 0):
+    # random RGBA with some flat runs, which the sub filter turns into zeros
+    rng = np.random.default_rng(seed)
+    page = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    page[height // 2:, :width // 2] = (255, 255, 255, 255)
+    return page
+
+
+def writePage(writer, page, bands):
+    # the rows in bands of equal height, the last one taking what is left
+    height = page.shape[0]
+    rows = -(-height // bands)
+    for y0 in range(0, height, rows):
+        band = np.ascontiguousarray(page[y0:y0 + rows])
+        writer.writeRows(band.tobytes(), len(band))
+    writer.close()
+
+
+def imagePixels(img, image_format = QImage.Format.Format_RGBA8888):
+    rgba = img.convertToFormat(image_format)
+    bits = np.frombuffer(rgba.constBits(), dtype=np.uint8).reshape(img.height(), rgba.bytesPerLine())
+    return bits[:, :img.width() * 4].reshape(img.height(), img.width(), 4).copy()
+
+
+def readPage(filename, width, height, image_format = QImage.Format.Format_RGBA8888):
+    img = QImage(filename)
+    assert not img.isNull()
+    assert (img.width(), img.height()) == (width, height)
+    return imagePixels(img, image_format)
+
+
+def premultiplied(page):
+    height, width = page.shape[0:2]
+    data = page.tobytes()
+    return imagePixels(QImage(data, width, height, width * 4, QImage.Format.Format_RGBA8888), QImage.Format.Format_RGBA8888_Premultiplied)
+
+
+@pytest.mark.parametrize('width', [1, 7, 33])
+@pytest.mark.parametrize('bands', [1, 2, 5])
+@pytest.mark.parametrize('level', [0, 6, 9])
+def test_png_round_trip(tmp_path, width, bands, level):
+    height = 23
+    page = randomPage(width, height)
+    filename = str(tmp_path / 'page.png')
+    writePage(PngStreamWriter(filename, width, height, level), page, bands)
+    np.testing.assert_array_equal(readPage(filename, width, height), page)
+
+
+@pytest.mark.parametrize('width', [1, 7, 33])
+@pytest.mark.parametrize('bands', [1, 2, 5])
+def test_tiff_round_trip(tmp_path, width, bands):
+    # a single band keeps its strip offset and size inline in the directory,
+    # more bands write them out of line. Qt reads TIFF premultiplied, so the
+    # pixels are compared that way
+    height = 23
+    page = randomPage(width, height)
+    filename = str(tmp_path / 'page.tif')
+    writePage(TiffStreamWriter(filename, width, height), page, bands)
+    np.testing.assert_array_equal(readPage(filename, width, height, QImage.Format.Format_RGBA8888_Premultiplied), premultiplied(page))
+
+
+def test_raw_rows(tmp_path):
+    page = randomPage(7, 23)
+    filename = str(tmp_path / 'page.rgba')
+    writePage(RawStreamWriter(filename, 7, 23), page, 5)
+    with open(filename, 'rb') as read_file:
+        assert read_file.read() == page.tobytes()
+
+
+@pytest.mark.parametrize('fmt', ['png', 'tiff'])
+def test_open_page_writer(tmp_path, fmt):
+    page = randomPage(16, 9, seed=1)
+    # an opaque page reads back exactly from either format
+    page[:, :, 3] = 255
+    filename = str(tmp_path / ('page.' + fmt))
+    writer = openPageWriter(filename, fmt, 16, 9)
+    writePage(writer, page, 3)
+    assert writer.rows == 9
+    np.testing.assert_array_equal(readPage(filename, 16, 9), page)
@@ -0,0 +1,161 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+import struct
+
+import numpy as np
+import pytest
+
+from timeseries import BINARY_ALIGN, BINARY_ARRAYS, BINARY_MAGIC, TimeSeriesGraph, listSlices
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# numbers of every shape raw_decode can stop inside of, a name outside ASCII,
+# d3 style endpoint objects, and a member the parser skips
+SLICE = {
+    'year': 1.5,
+    'nodes': [
+        {'id': 'a', 'name': 'Harry', 'x': 12e3, 'y': -0.25, 'centrality': 0},
+        {'id': 'b', 'name': 'Hermine Granger', 'x': -1.5e-3, 'y': 1E+2, 'centrality': 0.125},
+        {'id': 'c', 'name': 'Rubeus Hagrid é', 'x': 7, 'y': 123456789.0, 'centrality': 1},
+    ],
+    'edges': [
+        {'source': 'a', 'target': 'b', 'weight': 30},
+        {'source': {'id': 'b'}, 'target': {'id': 'c'}, 'weight': 2.297e3},
+        {'source': 'c', 'target': 'a', 'weight': 1},
+    ],
+    'directed': False,
+    'weight': 12e3,
+}
+
+
+def emptyGraph():
+    graph = TimeSeriesGraph.__new__(TimeSeriesGraph)
+    graph.path = None
+    graph.node_ids = []
+    graph.node_names = []
+    graph.node_rows = {}
+    graph.slices = []
+    graph.files_read = 0
+    graph.mapped = None
+    return graph
+
+
+def assertSameSlice(a, b):
+    for field, dtype in BINARY_ARRAYS:
+        np.testing.assert_array_equal(getattr(a, field), getattr(b, field), err_msg=field)
+
+
+@pytest.mark.parametrize('document', [
+    SLICE,
+    # edges before nodes are resolved once the nodes are known
+    {'edges': SLICE['edges'], 'nodes': SLICE['nodes']},
+    {'year': 12e3, 'nodes': [], 'edges': []},
+])
+def test_stream_matches_loads_at_every_chunk_size(document):
+    raw = json.dumps(document, indent=1, ensure_ascii=False).encode('utf-8')
+    loaded = emptyGraph()
+    expected = loaded.addSlice('slice', json.loads(raw))
+    for chunk_size in range(1, len(raw) + 2):
+        graph = emptyGraph()
+        ts = graph.streamSlice('slice', io.BytesIO(raw), chunk_size)
+        assertSameSlice(ts, expected)
+        assert graph.node_ids == loaded.node_ids
+        assert graph.node_names == loaded.node_names
+        assert ts.digest == hashlib.sha256(raw).hexdigest()
+
+
+def test_stream_matches_loads_on_data():
+    fn = listSlices(DATA)[0]
+    with open(os.path.join(DATA, fn), 'rb') as read_file:
+        raw = read_file.read()
+    expected = emptyGraph().addSlice(fn, json.loads(raw))
+    for chunk_size in (1 << 20, 4096, 1000, 7):
+        ts = emptyGraph().streamSlice(fn, io.BytesIO(raw), chunk_size)
+        assertSameSlice(ts, expected)
+
+
+def test_stream_rejects_truncated_slices():
+    raw = json.dumps(SLICE).encode('utf-8')
+    for end in (len(raw) - 1, len(raw) // 2):
+        with pytest.raises(ValueError):
+            emptyGraph().streamSlice('slice', io.BytesIO(raw[:end]), 16)
+
+
+def test_binary_round_trip(tmp_path):
+    graph = TimeSeriesGraph(DATA)
+    filename = str(tmp_path / 'hp.bin')
+    graph.writeBinary(filename)
+
+    mapped = TimeSeriesGraph(filename)
+    assert mapped.mapped is not None
+    assert mapped.node_ids == graph.node_ids
+    assert mapped.node_names == graph.node_names
+    assert mapped.node_rows == graph.node_rows
+    assert len(mapped.slices) == len(graph.slices)
+    for a, b in zip(mapped.slices, graph.slices):
+        assert a.name == b.name
+        assert a.digest == b.digest
+        assertSameSlice(a, b)
+    assert mapped.bounds() == graph.bounds()
+
+
+def test_binary_arrays_are_aligned(tmp_path):
+    filename = str(tmp_path / 'hp.bin')
+    TimeSeriesGraph(DATA).writeBinary(filename)
+    with open(filename, 'rb') as read_file:
+        data = read_file.read()
+    assert data[:len(BINARY_MAGIC)] == BINARY_MAGIC
+    version, header_length = struct.unpack_from('<IQ', data, len(BINARY_MAGIC))
+    header_start = len(BINARY_MAGIC) + 12
+    header = json.loads(data[header_start:header_start + header_length])
+    data_start = header_start + header_length
+    data_start += -data_start % BINARY_ALIGN
+    for entry in header['slices']:
+        for field, dtype in BINARY_ARRAYS:
+            offset, count = entry['arrays'][field]
+            assert (data_start + offset) % BINARY_ALIGN == 0
+            assert data_start + offset + count * np.dtype(dtype).itemsize <= len(data)
+
+
+def test_binary_rejects_bad_magic_and_version(tmp_path):
+    filename = str(tmp_path / 'hp.bin')
+    TimeSeriesGraph(DATA).writeBinary(filename)
+    with open(filename, 'rb') as read_file:
+        data = bytearray(read_file.read())
+
+    bad_magic = tmp_path / 'magic.bin'
+    bad_magic.write_bytes(b'NOTAGRPH' + data[len(BINARY_MAGIC):])
+    with pytest.raises(ValueError, match='not a timeslice binary file'):
+        TimeSeriesGraph(str(bad_magic))
+
+    struct.pack_into('<I', data, len(BINARY_MAGIC), 99)
+    bad_version = tmp_path / 'version.bin'
+    bad_version.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match='unsupported version 99'):
+        TimeSeriesGraph(str(bad_version))
+
+
+def test_mapped_graph_pickles_by_path(tmp_path):
+    graph = TimeSeriesGraph(DATA)
+    filename = str(tmp_path / 'hp.bin')
+    graph.writeBinary(filename)
+    mapped = TimeSeriesGraph(filename)
+
+    data = pickle.dumps(mapped)
+    # the file name, not the arrays
+    assert len(data) < 1024
+    copy = pickle.loads(data)
+    assert copy.path == filename
+    assert copy.mapped is not None
+    for a, b in zip(copy.slices, graph.slices):
+        assertSameSlice(a, b)
+
+    # a series parsed from JSON has no file to map and goes by value
+    copy = pickle.loads(pickle.dumps(graph))
+    assert copy.mapped is None
+    assert copy.node_ids == graph.node_ids
+    for a, b in zip(copy.slices, graph.slices):
+        assertSameSlice(a, b)
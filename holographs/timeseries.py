@@ -0,0 +1,402 @@
+import argparse
+import codecs
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+from array import array
+
+import numpy as np
+
+# binary container: magic, version and header length, a JSON header with the
+# node table and array offsets, then the per slice arrays, each 64 byte aligned
+BINARY_MAGIC = b'HOLOGRPH'
+BINARY_VERSION = 1
+BINARY_ALIGN = 64
+BINARY_ARRAYS = [
+    ('node_rows', '<i8'),
+    ('x', '<f8'),
+    ('y', '<f8'),
+    ('centrality', '<f8'),
+    ('edge_source', '<i8'),
+    ('edge_target', '<i8'),
+    ('weight', '<f8'),
+]
+
+
+def naturalKey(fn):
+    # hp_year2.json sorts before hp_year10.json
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', fn)]
+
+
+def listSlices(path):
+    return sorted([fn for fn in os.listdir(path) if fn.endswith('.json')], key=naturalKey)
+
+
+def endpointId(endpoint):
+    # d3 replaces the ids in source/target with copies of the node objects
+    if isinstance(endpoint, dict):
+        return endpoint['id']
+    return endpoint
+
+
+def alignOffset(offset):
+    return (offset + BINARY_ALIGN - 1) // BINARY_ALIGN * BINARY_ALIGN
+
+
+def arrayMin(values):
+    return float(values.min()) if values.size else float('inf')
+
+
+def arrayMax(values):
+    return float(values.max()) if values.size else float('-inf')
+
+
+class JsonStream:
+    # pulls JSON values out of a file one chunk at a time, so the members of
+    # the top level object can be walked without holding the whole document
+    whitespace = re.compile(r'[ \t\n\r]*')
+    # characters that can continue a number raw_decode stopped at
+    number_chars = frozenset('0123456789+-.eE')
+
+    def __init__(self, read_file, chunk_size = 1 << 20):
+        self.read_file = read_file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.digest = hashlib.sha256()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = self.read_file.read(self.chunk_size)
+        self.digest.update(chunk)
+        self.eof = len(chunk) == 0
+        self.buf = self.buf[self.pos:] + self.text.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # next non whitespace character, reading more input as needed
+        while True:
+            self.pos = self.whitespace.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("expected '" + char + "' in " + str(getattr(self.read_file, 'name', 'stream')))
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number may continue in the next chunk, even after a
+                # shorter one decoded from "1." or "12e"; only a character
+                # that cannot be part of it ends it
+                number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if self.eof or (end < len(self.buf) and not (number and self.buf[end] in self.number_chars)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def keys(self):
+        # yields the keys of the top level object; the caller consumes each
+        # value with value() or elements() before asking for the next key
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect('}')
+                return
+
+    def elements(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect(']')
+                return
+
+
+class ImageMapping:
+    # affine map from graph space into the margin box of a width x height image
+    def __init__(self, bounds, width, height, margin_x, margin_y):
+        self.graph_x_min, self.graph_x_max, self.graph_y_min, self.graph_y_max = bounds[0:4]
+        self.img_x_min = margin_x
+        self.img_x_max = width - margin_x
+        self.img_y_min = margin_y
+        self.img_y_max = height - margin_y
+        self.key = (self.graph_x_min, self.graph_x_max, self.graph_y_min, self.graph_y_max, self.img_x_min, self.img_x_max, self.img_y_min, self.img_y_max)
+
+    def map(self, x, y):
+        # same operation order as mapInterval so results match it bit for bit
+        px = self.img_x_min + (self.img_x_max - self.img_x_min) * ((x - self.graph_x_min) / (self.graph_x_max - self.graph_x_min))
+        py = self.img_y_min + (self.img_y_max - self.img_y_min) * ((y - self.graph_y_min) / (self.graph_y_max - self.graph_y_min))
+        return px, py
+
+
+class Timeslice:
+    def __init__(self, name, node_rows, x, y, centrality, edge_source, edge_target, weight):
+        self.name = name
+        # row of each node in the graph's node table
+        self.node_rows = np.asarray(node_rows, dtype=np.intp)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.centrality = np.asarray(centrality, dtype=np.float64)
+        # edge endpoints index into the node arrays of this slice
+        self.edge_source = np.asarray(edge_source, dtype=np.intp)
+        self.edge_target = np.asarray(edge_target, dtype=np.intp)
+        self.weight = np.asarray(weight, dtype=np.float64)
+        self.coords = None
+        # hash of the source file, identifies the slice in the render cache
+        self.digest = None
+
+    def nodeCount(self):
+        return len(self.node_rows)
+
+    def edgeCount(self):
+        return len(self.weight)
+
+    def bounds(self):
+        return [arrayMin(self.x), arrayMax(self.x), arrayMin(self.y), arrayMax(self.y), arrayMin(self.centrality), arrayMax(self.centrality), arrayMin(self.weight), arrayMax(self.weight)]
+
+    def imageCoords(self, mapping):
+        # mapped once per page geometry and shared by every layer drawn from this slice
+        if self.coords is None or self.coords[0] != mapping.key:
+            px, py = mapping.map(self.x, self.y)
+            self.coords = (mapping.key, px, py)
+        return self.coords[1], self.coords[2]
+
+
+class TimeSeriesGraph:
+    def __init__(self, path, stream = False):
+        self.path = path
+        self.node_ids = []
+        self.node_names = []
+        self.node_rows = {}
+        self.slices = []
+        self.files_read = 0
+        self.mapped = None
+
+        if os.path.isfile(path):
+            self.loadBinary(path)
+            return
+
+        for fn in listSlices(path):
+            with open(os.path.join(path, fn), "rb") as read_file:
+                if stream:
+                    ts = self.streamSlice(fn, read_file)
+                else:
+                    raw = read_file.read()
+                    ts = self.addSlice(fn, json.loads(raw))
+                    ts.digest = hashlib.sha256(raw).hexdigest()
+            self.files_read += 1
+            self.slices.append(ts)
+
+    def nodeRow(self, node_id, name):
+        row = self.node_rows.get(node_id)
+        if row is None:
+            row = len(self.node_ids)
+            self.node_rows[node_id] = row
+            self.node_ids.append(node_id)
+            self.node_names.append(name)
+        return row
+
+    def addSlice(self, name, data):
+        nodes = data['nodes']
+        edges = data['edges']
+        local = {}
+        node_rows = []
+        for node in nodes:
+            local[node['id']] = len(node_rows)
+            node_rows.append(self.nodeRow(node['id'], node['name']))
+
+        return Timeslice(
+            name,
+            node_rows,
+            [node['x'] for node in nodes],
+            [node['y'] for node in nodes],
+            [node['centrality'] for node in nodes],
+            [local[endpointId(edge['source'])] for edge in edges],
+            [local[endpointId(edge['target'])] for edge in edges],
+            [edge['weight'] for edge in edges],
+        )
+
+    def __reduce__(self):
+        # a memory mapped series is sent to worker processes by file name,
+        # they map the same file and share the OS page cache
+        if self.mapped is not None:
+            return (TimeSeriesGraph, (self.path,))
+        return object.__reduce__(self)
+
+    def loadBinary(self, filename):
+        # the slice arrays are zero copy views into the mapped file
+        with open(filename, "rb") as read_file:
+            self.mapped = mmap.mmap(read_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.files_read += 1
+        if self.mapped[0:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            raise ValueError(filename + " is not a timeslice binary file")
+        version, header_length = struct.unpack_from('<IQ', self.mapped, len(BINARY_MAGIC))
+        if version != BINARY_VERSION:
+            raise ValueError(filename + " has unsupported version " + str(version))
+        header_start = len(BINARY_MAGIC) + 12
+        header = json.loads(self.mapped[header_start:header_start + header_length])
+        data_start = alignOffset(header_start + header_length)
+
+        self.node_ids = header['node_ids']
+        self.node_names = header['node_names']
+        self.node_rows = {node_id: row for row, node_id in enumerate(self.node_ids)}
+        for entry in header['slices']:
+            arrays = {}
+            for field, dtype in BINARY_ARRAYS:
+                offset, count = entry['arrays'][field]
+                arrays[field] = np.frombuffer(self.mapped, dtype=dtype, count=count, offset=data_start + offset)
+            ts = Timeslice(entry['name'], **arrays)
+            ts.digest = entry['digest']
+            self.slices.append(ts)
+
+    def writeBinary(self, filename):
+        header = {'node_ids': self.node_ids, 'node_names': self.node_names, 'slices': []}
+        blocks = []
+        offset = 0
+        for ts in self.slices:
+            entry = {'name': ts.name, 'digest': ts.digest, 'arrays': {}}
+            for field, dtype in BINARY_ARRAYS:
+                values = np.ascontiguousarray(getattr(ts, field), dtype=dtype)
+                entry['arrays'][field] = [offset, len(values)]
+                blocks.append((offset, values))
+                offset = alignOffset(offset + values.nbytes)
+            header['slices'].append(entry)
+
+        text = json.dumps(header).encode('utf-8')
+        header_start = len(BINARY_MAGIC) + 12
+        data_start = alignOffset(header_start + len(text))
+        with open(filename, "wb") as write_file:
+            write_file.write(BINARY_MAGIC)
+            write_file.write(struct.pack('<IQ', BINARY_VERSION, len(text)))
+            write_file.write(text)
+            for block_offset, values in blocks:
+                write_file.seek(data_start + block_offset)
+                write_file.write(memoryview(values).cast('B'))
+            write_file.truncate(data_start + offset)
+
+    def streamSlice(self, name, read_file, chunk_size = 1 << 20):
+        # one node or edge object at a time straight into compact columns;
+        # peak memory follows the node and edge counts, not the text size
+        stream = JsonStream(read_file, chunk_size)
+        local = {}
+        node_rows = array('q')
+        x = array('d')
+        y = array('d')
+        centrality = array('d')
+        edge_source = array('q')
+        edge_target = array('q')
+        weight = array('d')
+        # endpoint ids of edges listed before the nodes, resolved at the end
+        pending = None
+
+        for key in stream.keys():
+            if key == 'nodes':
+                for node in stream.elements():
+                    local[node['id']] = len(node_rows)
+                    node_rows.append(self.nodeRow(node['id'], node['name']))
+                    x.append(node['x'])
+                    y.append(node['y'])
+                    centrality.append(node['centrality'])
+            elif key == 'edges':
+                if len(local) == 0:
+                    pending = ([], [])
+                for edge in stream.elements():
+                    if pending is None:
+                        edge_source.append(local[endpointId(edge['source'])])
+                        edge_target.append(local[endpointId(edge['target'])])
+                    else:
+                        pending[0].append(endpointId(edge['source']))
+                        pending[1].append(endpointId(edge['target']))
+                    weight.append(edge['weight'])
+            else:
+                stream.value()
+
+        if pending is not None:
+            edge_source = array('q', [local[node_id] for node_id in pending[0]])
+            edge_target = array('q', [local[node_id] for node_id in pending[1]])
+
+        ts = Timeslice(name, node_rows, x, y, centrality, edge_source, edge_target, weight)
+        ts.digest = stream.digest.hexdigest()
+        return ts
+
+    def nodeCount(self):
+        return len(self.node_ids)
+
+    def bounds(self):
+        if len(self.slices) == 0:
+            return [float('inf'), float('-inf')] * 4
+        per_slice = np.array([ts.bounds() for ts in self.slices])
+        mins = per_slice[:, 0::2].min(axis=0)
+        maxs = per_slice[:, 1::2].max(axis=0)
+        return [float(v) for pair in zip(mins, maxs) for v in pair]
+
+    def highlightMask(self, highlight):
+        # boolean per node table row; an empty highlight list selects nothing
+        mask = np.zeros(self.nodeCount(), dtype=bool)
+        for node_id in highlight:
+            row = self.node_rows.get(node_id)
+            if row is not None:
+                mask[row] = True
+        return mask
+
+    def trajectories(self, mapping):
+        # image space positions of every node across the slices, grouped by node
+        # table row (first appearance order) and kept in slice order within a row
+        if len(self.slices) == 0:
+            empty = np.zeros(0)
+            return np.zeros(0, dtype=np.intp), np.zeros(1, dtype=np.intp), empty, empty
+        rows = np.concatenate([ts.node_rows for ts in self.slices])
+        coords = [ts.imageCoords(mapping) for ts in self.slices]
+        px = np.concatenate([c[0] for c in coords])
+        py = np.concatenate([c[1] for c in coords])
+        order = np.argsort(rows, kind='stable')
+        rows = rows[order]
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        offsets = np.r_[starts, len(rows)]
+        return rows[starts], offsets, px[order], py[order]
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Convert a directory of timeslice JSON files into one memory mappable binary file.")
+    parser.add_argument("input", help="directory with one JSON file per timeslice")
+    parser.add_argument("output", help="binary file to write, pass it as --input to the renderer")
+    parser.add_argument("--stream", action="store_true", help="parse slices incrementally instead of loading each JSON document whole")
+    args = parser.parse_args(argv)
+
+    graph = TimeSeriesGraph(args.input, args.stream)
+    graph.writeBinary(args.output)
+    print(len(graph.slices), "slices,", graph.nodeCount(), "nodes written to", args.output)
+
+if __name__ == "__main__":
+    main()
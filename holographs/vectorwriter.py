@@ -0,0 +1,82 @@
+import os
+
+from PySide6.QtCore import QMarginsF, QRectF, QSizeF
+from PySide6.QtGui import QPageSize, QPainter, QPdfWriter
+from PySide6.QtSvg import QSvgGenerator
+
+# vector devices run at the resolution of a QImage, so fonts given in points
+# come out the same size relative to the page as on the raster pages
+VECTOR_DPI = 96
+
+
+class PdfSheetWriter:
+    # every sheet is a page of one PDF; sheets are painted in their pixels,
+    # which the painter scales to millimetres at ppmm
+    def __init__(self, out, width, height, ppmm):
+        self.filename = os.path.join(out, "pages.pdf")
+        self.writer = QPdfWriter(self.filename)
+        self.writer.setResolution(VECTOR_DPI)
+        self.writer.setPageSize(QPageSize(QSizeF(width / ppmm, height / ppmm), QPageSize.Unit.Millimeter, "sheet", QPageSize.SizeMatchPolicy.ExactMatch))
+        self.writer.setPageMargins(QMarginsF(0, 0, 0, 0))
+        self.scale = VECTOR_DPI / 25.4 / ppmm
+        self.painter = None
+
+    def beginSheet(self, sheet):
+        if self.painter is None:
+            self.painter = QPainter()
+            self.painter.begin(self.writer)
+        else:
+            self.writer.newPage()
+        self.painter.save()
+        self.painter.scale(self.scale, self.scale)
+        return self.painter
+
+    def endSheet(self):
+        self.painter.restore()
+        return self.filename
+
+    def close(self):
+        if self.painter is not None:
+            self.painter.end()
+
+
+class SvgSheetWriter:
+    # one SVG per sheet with the sheet's size in millimetres
+    def __init__(self, out, width, height, ppmm):
+        self.out = out
+        self.width = width
+        self.height = height
+        self.scale = VECTOR_DPI / 25.4 / ppmm
+        self.painter = None
+
+    def beginSheet(self, sheet):
+        self.filename = os.path.join(self.out, "page_" + str(sheet) + ".svg")
+        generator = QSvgGenerator()
+        generator.setFileName(self.filename)
+        generator.setResolution(VECTOR_DPI)
+        size = QSizeF(self.width * self.scale, self.height * self.scale)
+        generator.setSize(size.toSize())
+        generator.setViewBox(QRectF(0, 0, size.width(), size.height()))
+        generator.setTitle("page " + str(sheet))
+        self.generator = generator
+        self.painter = QPainter()
+        self.painter.begin(generator)
+        self.painter.scale(self.scale, self.scale)
+        return self.painter
+
+    def endSheet(self):
+        self.painter.end()
+        self.painter = None
+        return self.filename
+
+    def close(self):
+        if self.painter is not None:
+            self.painter.end()
+
+
+# the sheet writer of each format, constructed with the output directory,
+# the sheet size in pixels and pixels per millimetre
+VECTOR_FORMATS = {
+    'pdf': PdfSheetWriter,
+    'svg': SvgSheetWriter,
+}